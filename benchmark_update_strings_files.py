@@ -0,0 +1,269 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+# benchmark_update_strings_files.py - Performance benchmarks for update_strings_files.py
+#
+# Generates a synthetic project (source files, *.lproj folders and Localizable.strings files) in a
+#   temporary folder and times the phases of the script separately: extract, parse (from text or
+#   from the snapshots), merge, save and the complete localize_code run. Results are printed (or
+#   written with -out=) as JSON so runs of different versions can be compared. Runs on any machine,
+#   Xcode is not required.
+#
+# Usage: ./benchmark_update_strings_files.py
+#          -files=[number_of_source_files]
+#          -locales=[number_of_locales]
+#          -keys=[number_of_keys]
+#          -translated=[ratio_of_translated_keys]
+#          -temporary=[ratio_of_temporary_keys]
+#          -repeat=[number_of_runs_per_phase]
+#          -out=[path_to_json_results]
+#          --scaling (time merge_with for 1k to 100k keys)
+#          --memory (measure the memory used by the parsed locales)
+#          --startup (time new interpreters importing and running the script)
+#
+# Keys that are neither translated nor temporary are missing from the locales, so they show up as
+#   added strings when merged. Every locale also contains a few keys removed from the sources.
+
+from sys import argv, executable, version
+from io import StringIO
+from contextlib import redirect_stdout
+from time import perf_counter, time
+import json
+import os
+import random
+import shutil
+import subprocess
+import tempfile
+import tracemalloc
+
+import update_strings_files as usf
+
+TEMP_TAG = '*'
+DEVELOPMENT_LANGUAGE_FOLDER = 'en' + usf.LPROJ_EXTENSION
+SCALING_SIZES = (1000, 10000, 25000, 50000, 100000)
+
+
+def generate_project(root, files, locales, keys, translated, temporary, seed=0):
+    rnd = random.Random(seed)
+    all_keys = ['screen.%d.label.%d' % (index % 97, index) for index in range(keys)]
+
+    # Sources are dated in the past, as files that were just written are always hashed by the cache
+    source_mtime = time() - 60
+    for index in range(files):
+        fname = os.path.join(root, 'Source%d.swift' % index)
+        with open(fname, 'w', encoding='utf_8') as f:
+            f.write('import UIKit\n\n// Generated by benchmark_update_strings_files.py\n')
+            for key in all_keys[index::files]:
+                f.write('let label = NSLocalizedString("%s", comment: "Comment for %s")\n' % (key, key))
+        os.utime(fname, (source_mtime, source_mtime))
+
+    folders = ['Base', 'en'] + ['locale%d' % index for index in range(locales)]
+    for folder in folders:
+        lproj = os.path.join(root, folder + usf.LPROJ_EXTENSION)
+        os.makedirs(lproj)
+        is_dev_language = folder in ('Base', 'en')
+
+        entries = []
+        for key in all_keys + ['removed.%d' % index for index in range(5)]:
+            draw = rnd.random()
+            if is_dev_language:
+                value = key
+            elif draw < translated:
+                value = 'Translated %s' % key
+            elif draw < translated + temporary:
+                value = TEMP_TAG + key
+            else:
+                continue
+            entries.append('/* Comment for %s */\n"%s" = "%s";\n\n' % (key, key, value))
+
+        with open(os.path.join(lproj, usf.STRINGS_FILE), 'w', encoding='utf_8') as f:
+            f.write(''.join(entries))
+
+    return [os.path.join(root, folder + usf.LPROJ_EXTENSION) for folder in folders]
+
+
+def measure(function, repeat):
+    timings = []
+    result = None
+    for _ in range(repeat):
+        start = perf_counter()
+        with redirect_stdout(StringIO()):
+            result = function()
+        timings.append(perf_counter() - start)
+
+    return result, {'min': min(timings), 'max': max(timings), 'mean': sum(timings) / len(timings), 'runs': repeat}
+
+
+def reset_state():
+    usf.TEMP_TAG = TEMP_TAG
+    usf.INITIALIZED_TABLES = set()
+    usf.TEMP_STRINGS_TABLES = set()
+    usf.SHOULD_TRIGGER_WARNING_BECAUSE_OF_TEMP_STRINGS = 0
+    usf.TEMP_WARNING_DETAILS = []
+
+
+def benchmark_phases(root, languages, repeat):
+    results = {}
+    strings_files = [os.path.join(language, usf.STRINGS_FILE) for language in languages]
+
+    usf.USE_CACHE = 0
+    tables, results['extract'] = measure(lambda: usf.extract_strings(root, 'NSLocalizedString'), repeat)
+    extracted = tables[usf.DEFAULT_TABLE]
+
+    usf.USE_CACHE = 1
+    usf.extract_strings(root, 'NSLocalizedString')
+    _, results['extract_cached'] = measure(lambda: usf.extract_strings(root, 'NSLocalizedString'), repeat)
+
+    old_files, results['parse'] = measure(lambda: [usf.LocalizedFile(fname, auto_read=True) for fname in strings_files],
+                                          repeat)
+
+    # The first read writes the snapshots of the parsed files, the next ones load them
+    for fname in strings_files:
+        usf.read_strings_file(fname)
+    _, results['read_snapshot'] = measure(lambda: [usf.read_strings_file(fname) for fname in strings_files], repeat)
+
+    def merge_all():
+        reset_state()
+        return [(fname, old.merge_with(extracted, fname, DEVELOPMENT_LANGUAGE_FOLDER))
+                for fname, old in zip(strings_files, old_files)]
+
+    merged_files, results['merge'] = measure(merge_all, repeat)
+
+    output = tempfile.mkdtemp(prefix='update_strings_benchmark_output_')
+    try:
+        def save_all():
+            # Saved into an empty folder so every file is written
+            for fname in os.listdir(output):
+                os.remove(os.path.join(output, fname))
+            for index, (_, merged) in enumerate(merged_files):
+                merged.save_to_file(os.path.join(output, '%d.strings' % index))
+
+        _, results['save'] = measure(save_all, repeat)
+        _, results['save_unchanged'] = measure(
+            lambda: [merged.save_to_file(os.path.join(output, '%d.strings' % index))
+                     for index, (_, merged) in enumerate(merged_files)], repeat)
+    finally:
+        shutil.rmtree(output, ignore_errors=True)
+
+    def localize():
+        reset_state()
+        usf.localize_code(root, '', 'NSLocalizedString', DEVELOPMENT_LANGUAGE_FOLDER)
+
+    _, results['localize_code'] = measure(localize, repeat)
+    return results
+
+
+def benchmark_scaling(repeat):
+    # merge_with should scale linearly with the number of keys
+    results = []
+    for size in SCALING_SIZES:
+        new = usf.LocalizedFile()
+        new.parse(''.join('/* c */\n"key %d" = "key %d";\n\n' % (index, index) for index in range(size)))
+        old = usf.LocalizedFile()
+        old.parse(''.join('/* c */\n"key %d" = "%s%d";\n\n' % (index, TEMP_TAG if index % 2 else 'Value ', index)
+                          for index in range(size // 10, size + size // 10)))
+
+        def merge_once():
+            reset_state()
+            return old.merge_with(new, 'fr.lproj/Localizable.strings', DEVELOPMENT_LANGUAGE_FOLDER)
+
+        _, timing = measure(merge_once, repeat)
+        timing['keys'] = size
+        timing['per_key'] = timing['min'] / size
+        results.append(timing)
+
+    return results
+
+
+def benchmark_memory(languages):
+    strings_files = [os.path.join(language, usf.STRINGS_FILE) for language in languages]
+
+    tracemalloc.start()
+    files = [usf.LocalizedFile(fname, auto_read=True) for fname in strings_files]
+    current, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    return {'locales': len(files), 'strings': sum(len(f.strings) for f in files), 'current_bytes': current,
+            'peak_bytes': peak}
+
+
+def benchmark_startup(root, repeat):
+    # The script runs on every build, so the time to start it matters as much as the phases. An
+    #   up to date project (warm cache, unchanged files) is the most common build.
+    script = os.path.abspath(usf.__file__)
+    commands = {
+        'import': [executable, '-c', 'import update_strings_files'],
+        'help': [executable, script, '--unknown'],
+        'up_to_date_run': [executable, script, '-src=' + root],
+    }
+
+    results = {}
+    for name, command in commands.items():
+        def run():
+            subprocess.run(command, cwd=os.path.dirname(script), stdout=subprocess.DEVNULL,
+                           stderr=subprocess.DEVNULL)
+
+        run()
+        _, results[name] = measure(run, repeat)
+
+    return results
+
+
+if __name__ == '__main__':
+    help_text = 'Usage: %s -files=200 -locales=10 -keys=5000 -translated=0.7 -temporary=0.2 -repeat=3 ' \
+                '-out=results.json --scaling --memory --startup' % argv[0]
+
+    options = {'files': 200, 'locales': 10, 'keys': 5000, 'translated': 0.7, 'temporary': 0.2, 'repeat': 3}
+    out = None
+    scaling = 0
+    memory = 0
+    startup = 0
+
+    for arg in argv[1:]:
+        name, _, value = arg.lstrip('-').partition('=')
+        if name in options and value != '':
+            options[name] = type(options[name])(value)
+            continue
+        if name == 'out' and value != '':
+            out = value
+            continue
+        if arg == '--scaling':
+            scaling = 1
+            continue
+        if arg == '--memory':
+            memory = 1
+            continue
+        if arg == '--startup':
+            startup = 1
+            continue
+        print(help_text)
+        quit(-1)
+
+    reset_state()
+    root = tempfile.mkdtemp(prefix='update_strings_benchmark_')
+    try:
+        languages = generate_project(root, options['files'], options['locales'], options['keys'],
+                                     options['translated'], options['temporary'])
+
+        results = {
+            'script_version': usf.SCRIPT_VERSION,
+            'python': version.split()[0],
+            'executable': executable,
+            'parameters': options,
+            'phases': benchmark_phases(root, languages, options['repeat']),
+        }
+        if scaling:
+            results['merge_scaling'] = benchmark_scaling(options['repeat'])
+        if memory:
+            results['memory'] = benchmark_memory(languages)
+        if startup:
+            results['startup'] = benchmark_startup(root, options['repeat'])
+    finally:
+        shutil.rmtree(root, ignore_errors=True)
+
+    report = json.dumps(results, indent=2, sort_keys=True)
+    if out is not None:
+        with open(out, 'w', encoding='utf_8') as f:
+            f.write(report + '\n')
+    else:
+        print(report)
@@ -0,0 +1,30 @@
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import update_strings_files as usf
+
+FIXTURES = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'fixtures')
+
+# The options of a run, restored after every test as the script keeps them in globals
+OPTIONS = ('TEMP_TAG', 'USE_CACHE', 'JOBS', 'STATS', 'CHECK_ONLY', 'WATCH_STATE', 'BATCH_STATE', 'STREAM_MERGE',
+           'REPORT', 'REPORT_DATA', 'RECORD_COVERAGE', 'IGNORE_WARN', 'INITIALIZED_TABLES', 'TEMP_STRINGS_TABLES',
+           'SHOULD_TRIGGER_WARNING_BECAUSE_OF_TEMP_STRINGS', 'SHOULD_TRIGGER_ERROR_BECAUSE_OF_DEFAULT_STRINGS',
+           'TEMP_WARNING_DETAILS')
+
+
+@pytest.fixture(autouse=True)
+def options():
+    saved = dict((name, getattr(usf, name)) for name in OPTIONS)
+    usf.TEMP_TAG = '*'
+    usf.TEMP_WARNING_DETAILS = []
+    yield
+    for name, value in saved.items():
+        setattr(usf, name, value)
+
+
+def serialize(localized_file):
+    return localized_file.__unicode__()
@@ -0,0 +1,18 @@
+#import "Settings.h"
+
+@implementation Settings
+
+- (void)viewDidLoad {
+    [super viewDidLoad];
+
+    // NSLocalizedString(@"commented.out", @"Never extracted")
+    self.title = NSLocalizedStringFromTable(@"settings.title", @"Settings", @"Settings screen title");
+    self.done = NSLocalizedStringFromTableInBundle(@"settings.done", @"Settings", [NSBundle mainBundle], @"Done button");
+    self.welcome = NSLocalizedStringWithDefaultValue(@"welcome", @"Onboarding", [NSBundle mainBundle], @"Welcome!",
+                                                     @"Welcome message");
+    self.split = NSLocalizedString(@"split." @"key", @"A " @"concatenated" @" comment");
+    self.quoted = NSLocalizedString(@"quote.\"key\"", @"Escaped \"quotes\"");
+    self.empty = NSLocalizedString(@"no.comment", nil);
+}
+
+@end
@@ -0,0 +1,30 @@
+import UIKit
+
+// NSLocalizedString("commented.out", comment: "Never extracted")
+/* NSLocalizedString("block.commented.out", comment: "Never extracted") */
+
+final class LabelsViewController: UIViewController {
+    override func viewDidLoad() {
+        super.viewDidLoad()
+
+        title = NSLocalizedString("screen.title", comment: "Title of the main screen")
+        let subtitle = NSLocalizedString("screen.subtitle", tableName: nil, bundle: .main, value: "", comment: "Subtitle")
+        let greeting = NSLocalizedString("greeting", tableName: "Onboarding", comment: "Greeting on the first screen")
+        let welcome = NSLocalizedString("welcome", tableName: "Onboarding", bundle: .main, value: "Welcome!",
+                                        comment: "Welcome message")
+        let quoted = NSLocalizedString("quote.\"key\"", comment: "Escaped \"quotes\"")
+        let unlabeled = NSLocalizedString("no.comment", comment: "")
+        let interpolated = NSLocalizedString("hello \(name)", comment: "Skipped, not a literal")
+        let computed = NSLocalizedString(key, comment: "Skipped, not a literal")
+        let concatenated = NSLocalizedString("con" + "catenated", comment: "Skipped, not a literal")
+        let total = "\(NSLocalizedString("total", comment: "Total of the cart")): \(count("\(items)"))"
+        let summary = """
+            \(NSLocalizedString("summary", comment: "Summary of the cart")) \(total)
+            """
+        print(subtitle, greeting, welcome, quoted, unlabeled, interpolated, computed, concatenated, total, summary)
+    }
+
+    func duplicate() -> String {
+        return NSLocalizedString("screen.title", comment: "Navigation bar title")
+    }
+}
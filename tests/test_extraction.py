@@ -0,0 +1,51 @@
+# Compares the in-process extractor with the genstrings output of the fixtures (converted to UTF-8)
+import os
+
+import pytest
+
+import update_strings_files as usf
+from conftest import FIXTURES, serialize
+
+EXTRACTION_FIXTURES = os.path.join(FIXTURES, 'extraction')
+
+
+@pytest.mark.parametrize('fixture', sorted(os.listdir(EXTRACTION_FIXTURES)))
+def test_matches_genstrings(fixture):
+    root = os.path.join(EXTRACTION_FIXTURES, fixture)
+    usf.USE_CACHE = 0
+    extracted = usf.extract_strings(root, 'NSLocalizedString')
+
+    expected_folder = os.path.join(root, 'expected')
+    expected = {}
+    for name in os.listdir(expected_folder):
+        with open(os.path.join(expected_folder, name), encoding='utf_8') as f:
+            expected[os.path.splitext(name)[0]] = f.read()
+
+    assert dict((table, serialize(localized_file)) for table, localized_file in extracted.items()) == expected
+
+
+def test_custom_routine():
+    text = 'let a = MyString("key", comment: "Comment")\nlet b = NSLocalizedString("other", comment: "")\n'
+    assert usf.extract_strings_from_text(text, 'MyString') == [('Localizable', 'key', 'key', 'Comment')]
+
+
+def test_skips_non_literal_arguments():
+    text = 'NSLocalizedString("a \\(b)", comment: "")\nNSLocalizedString(key, comment: "")\n'
+    assert usf.extract_strings_from_text(text, 'NSLocalizedString') == []
+
+
+def test_ignores_calls_in_comments_and_strings():
+    text = '// NSLocalizedString("a", comment: "")\nlet s = "NSLocalizedString(\\"b\\", comment: \\"\\")"\n'
+    assert usf.extract_strings_from_text(text, 'NSLocalizedString') == []
+
+
+def test_extracts_calls_in_interpolations():
+    text = 'let a = "\\(x ? NSLocalizedString("yes", comment: "") : "\\(NSLocalizedString("no", comment: ""))")"\n' \
+           'let b = NSLocalizedString("b \\(NSLocalizedString("c", comment: ""))", comment: "")\n'
+    assert sorted(key for _, key, _, _ in usf.extract_strings_from_text(text, 'NSLocalizedString')) == \
+        ['c', 'no', 'yes']
+
+
+def test_joins_only_adjacent_literals():
+    text = 'NSLocalizedString(@"a" @"b", @"")\nNSLocalizedString("c" + "d", comment: "")\n'
+    assert [key for _, key, _, _ in usf.extract_strings_from_text(text, 'NSLocalizedString')] == ['ab']
@@ -0,0 +1,82 @@
+# Round trips randomly written .strings files through parse and save
+import random
+
+import pytest
+
+import update_strings_files as usf
+from conftest import serialize
+
+FUZZ_SEEDS = range(200)
+CHARACTERS = ['a', 'Z', '0', ' ', '.', '%@', '=', ';', '/', '*', 'é', '日本', '\\"', '\\\\', '\\n', '\\t']
+
+
+def random_literal(rnd):
+    return ''.join(rnd.choice(CHARACTERS) for _ in range(rnd.randint(0, 12)))
+
+
+def random_comment(rnd):
+    text = random_literal(rnd).replace('*/', '* /')
+    if rnd.random() < 0.5:
+        return '// %s\n' % text.replace('\n', ' ')
+    return '/* %s%s */' % (text, '\n   ' + random_literal(rnd).replace('*/', '* /') if rnd.random() < 0.3 else '')
+
+
+def random_space(rnd, allow_empty=True):
+    return ''.join(rnd.choice([' ', '\t', '\n']) for _ in range(rnd.randint(0 if allow_empty else 1, 3)))
+
+
+def random_file(rnd):
+    entries = []
+    expected = []
+    for index in range(rnd.randint(0, 20)):
+        comments = ''.join(random_comment(rnd) + random_space(rnd) for _ in range(rnd.choice([0, 0, 1, 1, 2])))
+        key = '%d.%s' % (index, random_literal(rnd))
+        value = random_literal(rnd)
+        entries.append('%s%s"%s"%s=%s"%s"%s;' % (random_space(rnd), comments, key, random_space(rnd), random_space(rnd),
+                                                value, random_space(rnd)))
+        expected.append((key, value))
+
+    trailing = random_space(rnd) + random_comment(rnd) if rnd.random() < 0.2 else ''
+    return ''.join(entries) + trailing + random_space(rnd), expected
+
+
+def parsed(text):
+    localized_file = usf.LocalizedFile()
+    localized_file.parse(text)
+    return localized_file
+
+
+def fields(localized_file):
+    return [(string.key, string.value, string.comments) for string in localized_file.strings]
+
+
+@pytest.mark.parametrize('seed', FUZZ_SEEDS)
+def test_round_trip(seed):
+    text, expected = random_file(random.Random(seed))
+
+    first = parsed(text)
+    assert [(string.key, string.value) for string in first.strings] == expected
+
+    saved = serialize(first)
+    second = parsed(saved)
+    assert fields(second) == fields(first)
+    assert second.trailing_comments == first.trailing_comments
+    assert serialize(second) == saved
+
+
+def test_canonical_file_is_verbatim():
+    text = '/* Comment */\n"key" = "value";\n\n"other" = "\\"quoted\\"";\n\n'
+    localized_file = parsed(text)
+    assert localized_file.verbatim
+    assert serialize(localized_file) == text
+
+
+def test_trailing_comment_is_kept():
+    localized_file = parsed('"key" = "value";\n// Last comment\n')
+    assert serialize(localized_file) == '"key" = "value";\n\n// Last comment\n'
+
+
+@pytest.mark.parametrize('text', ['"key" = "value"', '"key" = value;', 'junk\n"key" = "value";', '"key" = "value";\njunk'])
+def test_invalid_file(text):
+    with pytest.raises(Exception):
+        parsed(text)
@@ -0,0 +1,219 @@
+# Runs the script on small projects written to a temporary folder
+import hashlib
+import json
+import multiprocessing
+import os
+import tempfile
+
+import pytest
+
+import update_strings_files as usf
+
+SOURCE = 'let a = NSLocalizedString("a", comment: "A")\n'
+
+
+def write(fname, text):
+    os.makedirs(os.path.dirname(fname), exist_ok=True)
+    with open(fname, encoding='utf_8', mode='w') as f:
+        f.write(text)
+
+
+@pytest.fixture
+def project(tmp_path):
+    write(str(tmp_path / 'Source.swift'), SOURCE)
+    write(str(tmp_path / 'en.lproj' / 'Localizable.strings'), '/* A */\n"a" = "a";\n\n')
+    write(str(tmp_path / 'fr.lproj' / 'Localizable.strings'), '/* A */\n"a" = "le a";\n\n')
+    return str(tmp_path)
+
+
+def run(path):
+    return usf.run_captured(path, 'NSLocalizedString', 'en.lproj')
+
+
+def test_generated_table_does_not_trigger_error(project):
+    usf.SHOULD_TRIGGER_ERROR_BECAUSE_OF_DEFAULT_STRINGS = 1
+    with open(os.path.join(project, 'Source.swift'), encoding='utf_8', mode='a') as f:
+        f.write('let b = NSLocalizedString("b", tableName: "Other", comment: "B")\n')
+
+    result = run(project)
+    assert result['exit_code'] == 0
+    assert os.path.exists(os.path.join(project, 'fr.lproj', 'Other.strings'))
+
+
+def test_generated_table_keeps_error_of_other_tables(project):
+    usf.SHOULD_TRIGGER_ERROR_BECAUSE_OF_DEFAULT_STRINGS = 1
+    with open(os.path.join(project, 'Source.swift'), encoding='utf_8', mode='a') as f:
+        f.write('let b = NSLocalizedString("b", tableName: "Other", comment: "B")\n'
+                'let c = NSLocalizedString("c", comment: "C")\n')
+
+    result = run(project)
+    assert result['exit_code'] == -4
+
+
+@pytest.mark.parametrize('table', ['../Other', 'Sub/Other', '..'])
+def test_unsafe_table_is_ignored(project, table):
+    with open(os.path.join(project, 'Source.swift'), encoding='utf_8', mode='a') as f:
+        f.write('let b = NSLocalizedString("b", tableName: "%s", comment: "B")\n' % table)
+
+    result = run(project)
+    assert result['exit_code'] == 0
+    assert 'Other.strings' not in os.listdir(project)
+    for folder in ('en.lproj', 'fr.lproj'):
+        assert os.listdir(os.path.join(project, folder)) == ['Localizable.strings']
+
+
+def tree(path):
+    files = {}
+    for folder, _, fnames in os.walk(path):
+        for fname in fnames:
+            with open(os.path.join(folder, fname), mode='rb') as f:
+                files[os.path.relpath(os.path.join(folder, fname), path)] = f.read()
+    return files
+
+
+@pytest.fixture
+def spawn():
+    start_method = multiprocessing.get_start_method(allow_none=True)
+    multiprocessing.set_start_method('spawn', force=True)
+    yield
+    multiprocessing.set_start_method(start_method, force=True)
+
+
+def test_check_with_spawned_workers_writes_nothing(project, spawn):
+    usf.CHECK_ONLY = 1
+    usf.JOBS = 2
+    write(os.path.join(project, 'de.lproj', 'Localizable.strings'), '/* A */\n"a" = "das a";\n\n')
+    with open(os.path.join(project, 'Source.swift'), encoding='utf_8', mode='a') as f:
+        f.write('let b = NSLocalizedString("b", comment: "B")\n')
+    before = tree(project)
+
+    result = run(project)
+    assert result['exit_code'] == -5
+    assert tree(project) == before
+
+
+def test_interrupt_stops_captured_run(project, monkeypatch):
+    def interrupt(path):
+        raise KeyboardInterrupt()
+    monkeypatch.setattr(usf, 'find_languages', interrupt)
+
+    with pytest.raises(KeyboardInterrupt):
+        run(project)
+
+
+def test_daemon_socket_is_in_private_folder(tmp_path, monkeypatch):
+    monkeypatch.setattr(tempfile, 'tempdir', str(tmp_path))
+
+    socket_fname = usf.daemon_socket_fname('/project')
+    assert os.path.dirname(socket_fname) == str(tmp_path / ('update_strings_%d' % os.getuid()))
+    assert os.stat(os.path.dirname(socket_fname)).st_mode & 0o777 == 0o700
+
+
+def test_daemon_socket_rejects_shared_folder(tmp_path, monkeypatch):
+    monkeypatch.setattr(tempfile, 'tempdir', str(tmp_path))
+    os.mkdir(str(tmp_path / ('update_strings_%d' % os.getuid())), 0o777)
+    os.chmod(str(tmp_path / ('update_strings_%d' % os.getuid())), 0o777)
+
+    with pytest.raises(OSError):
+        usf.daemon_socket_fname('/project')
+
+
+@pytest.mark.parametrize('data', [
+    b'/* A */\n"a" = "le a";\n\n/* A */\n"a" = "le dernier a";\n\n',
+    b'/* A */\n"a" = "le \xe0";\n\n',
+])
+def test_stream_merge_matches_memory_merge(tmp_path, data):
+    results = []
+    for stream_merge in (0, 1):
+        path = str(tmp_path / str(stream_merge))
+        write(os.path.join(path, 'Source.swift'), SOURCE + 'let b = NSLocalizedString("b", comment: "B")\n')
+        write(os.path.join(path, 'en.lproj', 'Localizable.strings'), '/* A */\n"a" = "a";\n\n')
+        os.mkdir(os.path.join(path, 'fr.lproj'))
+        with open(os.path.join(path, 'fr.lproj', 'Localizable.strings'), mode='wb') as f:
+            f.write(data)
+
+        usf.STREAM_MERGE = stream_merge
+        result = run(path)
+        results.append((result['exit_code'], result['output'].replace(path, ''),
+                        tree(os.path.join(path, 'fr.lproj'))))
+
+    assert results[0] == results[1]
+
+
+@pytest.mark.parametrize('jobs', [1, 2])
+def test_report_of_generated_table(project, spawn, jobs):
+    usf.REPORT = 'json'
+    usf.JOBS = jobs
+    with open(os.path.join(project, 'Source.swift'), encoding='utf_8', mode='a') as f:
+        f.write('let b = NSLocalizedString("b", tableName: "Other", comment: "B")\n')
+
+    assert run(project)['exit_code'] == 0
+    with open(os.path.join(project, usf.CACHE_FOLDER, usf.REPORT_FILE), encoding='utf_8') as f:
+        report = json.load(f)['locales']
+    assert report['fr']['Other'] == {'added': ['b'], 'removed': [], 'temporary': [], 'translated': []}
+    assert report['fr']['Localizable']['translated'] == ['a']
+
+
+def test_snapshot_of_merged_file(project):
+    with open(os.path.join(project, 'Source.swift'), encoding='utf_8', mode='a') as f:
+        f.write('let b = NSLocalizedString("b", comment: "B")\n')
+
+    assert run(project)['exit_code'] == 0
+    fname = os.path.join(project, 'fr.lproj', 'Localizable.strings')
+    with open(fname, mode='rb') as f:
+        data = f.read()
+    snapshot = usf.load_strings_snapshot(fname)
+    assert snapshot['hash'] == hashlib.sha1(data).digest()
+    assert snapshot['size'] == len(data)
+
+
+def test_interpolated_call_keeps_translation(project):
+    write(os.path.join(project, 'Source.swift'),
+          'label.text = "\\(NSLocalizedString("a", comment: "A")): \\(x)"\n')
+
+    result = run(project)
+    assert result['exit_code'] == 0
+    assert '[...Removed]' not in result['output']
+    with open(os.path.join(project, 'fr.lproj', 'Localizable.strings'), encoding='utf_8') as f:
+        assert '"a" = "le a";' in f.read()
+
+
+def rewrite_in_same_tick(fname, old, new):
+    # Same size and mtime, as an edit made within the mtime tick of the previous write
+    stat = os.stat(fname)
+    with open(fname, encoding='utf_8') as f:
+        text = f.read()
+    with open(fname, encoding='utf_8', mode='w') as f:
+        f.write(text.replace(old, new))
+    os.utime(fname, ns=(stat.st_atime_ns, stat.st_mtime_ns))
+
+
+def test_racy_snapshot_is_hashed(project, monkeypatch):
+    source = os.path.join(project, 'Source.swift')
+    with open(source, encoding='utf_8', mode='a') as f:
+        f.write('let b = NSLocalizedString("b", comment: "B")\n')
+    assert run(project)['exit_code'] == 0
+
+    fname = os.path.join(project, 'fr.lproj', 'Localizable.strings')
+    rewrite_in_same_tick(fname, '"le a"', '"la a"')
+    now = usf.time()
+    monkeypatch.setattr(usf, 'time', lambda: now + 10)
+    with open(source, encoding='utf_8', mode='a') as f:
+        f.write('let c = NSLocalizedString("c", comment: "C")\n')
+
+    assert run(project)['exit_code'] == 0
+    with open(fname, encoding='utf_8') as f:
+        assert '"a" = "la a";' in f.read()
+
+
+def test_racy_extraction_record_is_hashed(project, monkeypatch):
+    source = os.path.join(project, 'Source.swift')
+    assert run(project)['exit_code'] == 0
+
+    rewrite_in_same_tick(source, 'NSLocalizedString("a", comment: "A")', 'NSLocalizedString("x", comment: "X")')
+    now = usf.time()
+    monkeypatch.setattr(usf, 'time', lambda: now + 10)
+
+    assert run(project)['exit_code'] == 0
+    with open(os.path.join(project, 'en.lproj', 'Localizable.strings'), encoding='utf_8') as f:
+        assert '"x" = "x";' in f.read()
@@ -106,41 +106,278 @@
 # - Add --strict and --nowarn to enable error triggering and ignore warnings.
 # - Remove interface localization to encourage all strings to be added from code.
 
-from sys import argv
-from codecs import open
-from re import compile
-from copy import copy
-import os
+# Version 1.1.0
+# - Cache the strings extracted from every source file in .update_strings_cache/ so only
+#   changed files are scanned again. Add the folder to your .gitignore. Use --nocache to disable.
+# - Add --jobs=N to scan source files and update the *.lproj folders using N processes.
+# - Read .strings files in a single pass. Escaped quotes, multi-line and // comments and entries
+#   without comments are now accepted instead of failing with 'Invalid file.'.
+# - Keep strings in a compact representation and merge them without copying.
+# - Only rewrite .strings files whose content changed, and replace them atomically.
+# - Detect the encoding of .strings files in-process. UTF-16 files are converted to UTF-8 instead
+#   of being read as empty.
+# - Add --stats-json=path to write the time, I/O and string counts of every phase and language,
+#   and --profile=path to write a cProfile dump of the run.
+# - Update every table used in the source code (tableName: / NSLocalizedStringFromTable), not only
+#   Localizable.strings.
+# - Add --check to merge everything in memory without touching any file. It exits with an error
+#   code whenever the Xcode error or warning would be triggered.
+# - Add --watch to run a daemon that keeps the project in memory and updates the .strings files
+#   as soon as a source or .strings file changes. Run the build phase with --client (and the same
+#   other arguments) to get the result from the daemon; without a daemon it runs as usual.
+# - Add --stream to merge existing .strings files without loading them: only their keys are kept
+#   in memory and the merged file is written while the extracted strings are merged.
+# - Add --report=summary to only print the counts of every file instead of one line per string, and
+#   --report=json to also write the added, removed, temporary and translated keys of every locale
+#   to .update_strings_cache/report.json. --report=verbose (the default) prints every string.
+# - Add --record-coverage to keep the coverage of every locale and the status of every key in
+#   .update_strings_cache/coverage.sqlite, and --coverage to print the latest coverage and the keys
+#   that have been temporary the longest in every locale, without reading any .strings file.
+# - Add -manifest=path (one project root per line) and --discover (every folder under -src
+#   containing *.lproj folders) to update several projects in one run. The source folders are
+#   walked once, files shared by nested projects are scanned once, the --jobs workers are shared
+#   and the Xcode error or warning is triggered once for all the projects.
+# - Keep a binary snapshot of every parsed .strings file in .update_strings_cache/strings/. Files
+#   whose size, mtime and hash did not change are loaded from it instead of being parsed again.
+# - Extract strings only once per project instead of once per language.
+# - Extract strings from .swift and .m files in-process, without xcrun extractLocStrings, so the
+#   script also runs on machines without Xcode.
+# - Check the version of the Python running the script in-process and only import the modules and
+#   compile the expressions a run needs, to shorten the startup of every build.
+
+from sys import argv, version_info
 
-re_translation = compile(r'^"(.+)" = "(.+)";$')
-left_side_of_translation = compile(r'^"(.+)" = ')
-re_comment_single = compile(r'^/\*.*\*/$')
-re_comment_start = compile(r'^/\*.*$')
-re_comment_end = compile(r'^.*\*/$')
+if __name__ == '__main__':
+    # Check for Python 3+, before importing the modules only available since Python 3.7
+    print('Executed with: ')
+    print('Python %d.%d.%d' % version_info[:3])
+    if version_info < (3, 7):
+        print('This script is written in python and was build compatible to Python 3.7.3. ' +
+              '\nIt may run using Python 3+ versions but I recommend this version for ' +
+              'any troubleshooting involved.\nTo download Python on your mac, go to ' +
+              'https://www.python.org, download and install.')
+        quit(-1)
 
-STRINGS_FILE = 'Localizable.strings'
+from codecs import open, BOM_UTF8, BOM_UTF16_LE, BOM_UTF16_BE
+from re import compile
+from re import DOTALL
+from time import time, perf_counter, strftime, localtime
+from io import StringIO
+from itertools import repeat
+from operator import is_
+from contextlib import redirect_stdout, contextmanager, nullcontext
+import hashlib
+import json
+import os
+import struct
+from stat import S_ISDIR
+
+# Only needed by some options, they are imported on first use to keep the startup of every build
+#   short: concurrent.futures (--jobs), cProfile (--profile), mmap (--stream), signal, socket and
+#   tempfile (--watch and --client)
+
+class LazyRegex():
+    # Compiled on first use, as most runs only need some of the expressions below
+    __slots__ = ('pattern', 'flags', 'compiled')
+
+    def __init__(self, pattern, flags=0):
+        self.pattern = pattern
+        self.flags = flags
+        self.compiled = None
+
+    def __getattr__(self, name):
+        if self.compiled is None:
+            self.compiled = compile(self.pattern, self.flags)
+        return getattr(self.compiled, name)
+
+
+re_translation = LazyRegex(r'^"(.+)" = "(.+)";$')
+
+# One match per entry: the comments preceding it (group 1), then the key (group 2) and value (group 3)
+re_strings_entry = LazyRegex(r'\s*((?:/\*[^*]*(?:\*(?!/)[^*]*)*\*/\s*|//[^\n]*\s*)*)'
+                             r'"([^"\\]*(?:\\.[^"\\]*)*)"\s*=\s*"([^"\\]*(?:\\.[^"\\]*)*)"\s*;')
+re_strings_tail = LazyRegex(r'(?:\s+|/\*[^*]*(?:\*(?!/)[^*]*)*\*/|//[^\n]*)*')
+re_strings_entry_bytes = LazyRegex(re_strings_entry.pattern.encode('ascii'))
+re_strings_tail_bytes = LazyRegex(re_strings_tail.pattern.encode('ascii'))
+
+# String literals end at their closing quotes or at the opening of a Swift interpolation \(
+re_source_token = LazyRegex(r'(?P<comment>//[^\n]*|/\*.*?(?:\*/|\Z))'
+                            r'|(?P<multiline>"""(?:[^\\"]|\\[^(]|"(?!""))*(?:"""|\\\(|\Z))'
+                            r'|(?P<string>@?"(?:[^"\\\n]|\\[^(])*(?:"|\\\())'
+                            r'|(?P<char>\'(?:[^\'\\\n]|\\.)*\')'
+                            r'|(?P<name>[A-Za-z_][A-Za-z0-9_]*)'
+                            r'|(?P<punctuation>[()\[\]{},:])'
+                            r'|(?P<other>[^"\'/@A-Za-z_()\[\]{},:]+|.)', DOTALL)
+# The rest of a string literal after an interpolation, up to its end or to the next interpolation
+re_source_string_rest = {
+    'string': LazyRegex(r'(?:[^"\\\n]|\\[^(])*(?:"|\\\()?'),
+    'multiline': LazyRegex(r'(?:[^\\"]|\\[^(]|"(?!""))*(?:"""|\\\(|\Z)?', DOTALL),
+}
+
+DEFAULT_TABLE = 'Localizable'
+STRINGS_EXTENSION = '.strings'
+STRINGS_FILE = DEFAULT_TABLE + STRINGS_EXTENSION
 LPROJ_EXTENSION = '.lproj'
+SOURCE_EXTENSIONS = ('.swift', '.m')
+DEFAULT_COMMENT = 'No comment provided by engineer.'
+
+# Argument layout of the routine variants recognised by genstrings, in positional order
+ROUTINE_VARIANTS = {
+    '': ('key', 'comment'),
+    'FromTable': ('key', 'table', 'comment'),
+    'FromTableInBundle': ('key', 'table', 'bundle', 'comment'),
+    'WithDefaultValue': ('key', 'table', 'bundle', 'value', 'comment'),
+}
+# Swift argument labels and the field they fill in
+ROUTINE_LABELS = {
+    'tableName': 'table',
+    'bundle': 'bundle',
+    'value': 'value',
+    'comment': 'comment',
+}
 
 TEMP_TAG = ''
 SHOULD_TRIGGER_WARNING_BECAUSE_OF_TEMP_STRINGS = 0
-TEMP_WARNING_DETAILS = ''
+TEMP_WARNING_DETAILS = []
 SHOULD_TRIGGER_ERROR_BECAUSE_OF_DEFAULT_STRINGS = 0
 
-DID_INITIALIZE = 0
+# Tables (project folder and table name) generated or merged with temporary strings during the run.
+#   The Xcode error is not triggered for the tables that were just generated.
+INITIALIZED_TABLES = set()
+TEMP_STRINGS_TABLES = set()
 IGNORE_WARN = 0
+USE_CACHE = 1
+JOBS = 1
+STATS = None
+CHECK_ONLY = 0
+WATCH_STATE = None
+BATCH_STATE = None
+STREAM_MERGE = 0
+REPORT = 'verbose'
+REPORT_DATA = None
+RECORD_COVERAGE = 0
+# The options a worker process needs, as spawned workers start with the defaults above
+WORKER_OPTIONS = ('TEMP_TAG', 'SHOULD_TRIGGER_ERROR_BECAUSE_OF_DEFAULT_STRINGS', 'IGNORE_WARN', 'USE_CACHE', 'CHECK_ONLY',
+                  'STREAM_MERGE', 'REPORT', 'RECORD_COVERAGE')
+
+SCRIPT_VERSION = '1.1.0'
+CACHE_FOLDER = '.update_strings_cache'
+EXTRACTION_CACHE_FILE = 'extraction.json'
+REPORT_FILE = 'report.json'
+SNAPSHOT_FOLDER = 'strings'
+SNAPSHOT_EXTENSION = '.bin'
+# Magic, format, size, mtime and hash of the .strings file, whether it is verbatim, whether it is
+#   racy (see is_racy), number of strings
+SNAPSHOT_HEADER = struct.Struct('<4sHQq20sBBI')
+SNAPSHOT_MAGIC = b'USFS'
+SNAPSHOT_FORMAT = 2
+REPORT_MODES = ('json', 'summary', 'verbose')
+COVERAGE_FILE = 'coverage.sqlite'
+# Number of keys --coverage lists for every locale
+COVERAGE_LIMIT = 10
+
+# The status of every key only changes since_run when it changes, so the keys that have been
+#   temporary the longest are the first ones of the key_status_age index
+COVERAGE_SCHEMA = '''
+CREATE TABLE IF NOT EXISTS runs (id INTEGER PRIMARY KEY, time REAL NOT NULL);
+CREATE TABLE IF NOT EXISTS coverage (
+    run INTEGER NOT NULL, locale TEXT NOT NULL, table_name TEXT NOT NULL,
+    total INTEGER NOT NULL, translated INTEGER NOT NULL, temporary INTEGER NOT NULL,
+    PRIMARY KEY (run, locale, table_name)) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS key_status (
+    locale TEXT NOT NULL, table_name TEXT NOT NULL, key TEXT NOT NULL, status TEXT NOT NULL,
+    since_run INTEGER NOT NULL, last_run INTEGER NOT NULL,
+    PRIMARY KEY (locale, table_name, key)) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS key_status_age ON key_status (locale, table_name, status, since_run);
+'''
+# Files read this soon after they were modified may change again within the same mtime tick
+CACHE_MTIME_GRACE = 2
+# Seconds between two scans of the project in --watch mode
+WATCH_INTERVAL = 1.0
+# Seconds a --client invocation waits for the daemon to answer
+DAEMON_TIMEOUT = 600
+
+
+class RunStats():
+    # Wall time, I/O and entry counters of a run, in total and per language, for --stats-json=
+    def __init__(self):
+        self.phases = {}
+        self.counters = {}
+        self.locales = {}
+        self.locale = None
+
+    @contextmanager
+    def phase(self, name):
+        start = perf_counter()
+        try:
+            yield
+        finally:
+            self.add_phase(name, perf_counter() - start)
+
+    def add_phase(self, name, seconds, calls=1):
+        for phases in self.targets('phases'):
+            phase = phases.setdefault(name, {'seconds': 0.0, 'calls': 0})
+            phase['seconds'] += seconds
+            phase['calls'] += calls
+
+    def count(self, name, amount=1):
+        for counters in self.targets('counters'):
+            counters[name] = counters.get(name, 0) + amount
+
+    def targets(self, kind):
+        targets = [getattr(self, kind)]
+        if self.locale is not None:
+            targets.append(self.locales.setdefault(self.locale, {'phases': {}, 'counters': {}})[kind])
+        return targets
+
+    def add_locale(self, locale, data):
+        # Folds the stats collected by a worker process for one language into this run
+        self.locales[locale] = data
+        for name, phase in data['phases'].items():
+            phase_total = self.phases.setdefault(name, {'seconds': 0.0, 'calls': 0})
+            phase_total['seconds'] += phase['seconds']
+            phase_total['calls'] += phase['calls']
+        for name, amount in data['counters'].items():
+            self.counters[name] = self.counters.get(name, 0) + amount
+
+    def to_dict(self):
+        return {'version': SCRIPT_VERSION, 'phases': self.phases, 'counters': self.counters, 'locales': self.locales}
+
+
+def stats_phase(name):
+    return STATS.phase(name) if STATS is not None else nullcontext()
+
+
+def stats_count(name, amount=1):
+    if STATS is not None:
+        STATS.count(name, amount)
 
 
 class LocalizedString():
-    def __init__(self, comments, translation):
-        self.comments, self.translation = comments, translation
-        self.key, self.value = re_translation.match(self.translation).groups()
+    # Kept small as there is one instance per key and language; the serialized translation line
+    #   is only built when it is written
+    __slots__ = ('comments', 'key', 'value', '_translation')
+
+    def __init__(self, comments, translation, key=None, value=None):
+        if key is None:
+            key, value = re_translation.match(translation).groups()
+        self.comments, self.key, self.value = comments, key, value
+        self._translation = translation
+
+    @property
+    def translation(self):
+        if self._translation is None:
+            self._translation = '"%s" = "%s";\n' % (self.key, self.value)
+        return self._translation
 
     def __unicode__(self):
         return u'%s%s\n' % (u''.join(self.comments), self.translation)
 
-    def update_translation(self):
-        left = left_side_of_translation.match(self.translation).group(0)
-        self.translation = left + '\"%s\"' % self.value + ';\n'
+    def with_value(self, value):
+        return LocalizedString(self.comments, None, self.key, value)
+
+    def with_comments(self, comments):
+        return LocalizedString(comments, self._translation, self.key, self.value)
 
 
 class LocalizedFile():
@@ -148,6 +385,12 @@ class LocalizedFile():
         self.fname = fname
         self.strings = []
         self.strings_d = {}
+        # Comments after the last entry, written back after the strings
+        self.trailing_comments = ''
+        # Whether saving to fname would write exactly the bytes it was read from
+        self.verbatim = False
+        # SHA-1 of the bytes last written by save_to_file
+        self.digest = None
 
         if auto_read:
             self.read_from_file(fname)
@@ -155,321 +398,1535 @@ class LocalizedFile():
     def read_from_file(self, fname=None):
         fname = self.fname if fname == None else fname
         try:
-            f = open(fname, encoding='utf_8', mode='r')
+            with stats_phase('read'), open(fname, mode='rb') as f:
+                data = f.read()
         except:
             print('File %s does not exist.' % fname)
-            f.close()
             exit(-1)
+        stats_count('bytes_read', len(data))
+
+        text = decode_strings_data(data)
+        if text is None:
+            raise Exception('Invalid file.')
+
+        with stats_phase('parse'):
+            self.parse(text)
+        self.verbatim = self.verbatim and text.encode('utf_8') == data
+
+    def parse(self, text):
+        # Tokenizes the whole buffer in one scan, keeping comments and entries as they were written
+        strings = self.strings
+        strings_d = self.strings_d
+        position = 0
+        # Saved files separate entries with one empty line, other layouts are rewritten
+        verbatim = True
+        separator = 0
+        for entry in re_strings_entry.finditer(text):
+            if entry.start() != position:
+                break
+
+            if verbatim and (entry.start(1) != position + separator or not text.startswith('\n\n'[:separator], position)):
+                verbatim = False
+            separator = 2
+
+            comments, key, value = entry.groups()
+            position = entry.end()
+
+            # Entries written in the canonical layout are rebuilt from key and value when saved
+            translation = None
+            if position != entry.end(3) + 2 or text[entry.end(2):entry.start(3)] != '" = "':
+                translation = text[entry.end(1):position] + '\n'
+
+            string = LocalizedString([comments] if comments else [], translation, key, value)
+            strings.append(string)
+            strings_d[key] = string
+
+        if re_strings_tail.match(text, position).end() != len(text):
+            raise Exception('Invalid file.')
+        tail = text[position:].strip()
+        self.trailing_comments = tail + '\n' if tail else ''
+        self.verbatim = verbatim and len(text) == position + separator and text.endswith('\n\n'[:separator])
 
-        found_one = 0
-
-        line = None
-        try:
-            line = f.readline()
-        except:
-            f.close()
-
-        while line:
-            comments = [line]
-
-            if not re_comment_single.match(line):
-                while line and not re_comment_end.match(line):
-                    line = f.readline()
-                    comments.append(line)
-
-            line = f.readline()
-            if line and re_translation.match(line):
-                found_one = 1
-                translation = line
-            else:
-                last_comment = comments and comments[-1]
-                if last_comment is not None and (last_comment == '' or found_one == 0):
-                    break
-
-                raise Exception('Invalid file.')
-
-            line = f.readline()
-            while line and line == u'\n':
-                line = f.readline()
-
-            string = LocalizedString(comments, translation)
-            self.strings.append(string)
-            self.strings_d[string.key] = string
-
-        f.close()
+    def __unicode__(self):
+        return u''.join([string.__unicode__() for string in self.strings]) + self.trailing_comments
 
     def save_to_file(self, fname=None):
+        # Returns whether the file was (or with --check would be) written. Unchanged files are left
+        #   untouched so Xcode does not copy and sign the resources again, changed ones are replaced
+        #   atomically.
         fname = self.fname if fname == None else fname
-        try:
-            f = open(fname, encoding='utf_8', mode='w')
-        except:
-            print('Couldn\'t open file %s.' % fname)
-            exit(-1)
+        if self.verbatim and fname == self.fname:
+            stats_count('unchanged_files')
+            return False
 
-        for string in self.strings:
-            f.write(string.__unicode__())
+        data = self.__unicode__().encode('utf_8')
+        digest = hashlib.sha1(data).digest()
 
-        f.close()
+        with stats_phase('save'):
+            try:
+                if os.stat(fname).st_size == len(data):
+                    with open(fname, mode='rb') as f:
+                        if hashlib.sha1(f.read()).digest() == digest:
+                            stats_count('unchanged_files')
+                            return False
+            except OSError:
+                pass
+
+            if CHECK_ONLY:
+                print('    %s is out of date.' % fname)
+                stats_count('outdated_files')
+                return True
+
+            temporary_fname = fname + '.new'
+            try:
+                with open(temporary_fname, mode='wb') as f:
+                    f.write(data)
+                os.replace(temporary_fname, fname)
+            except:
+                print('Couldn\'t open file %s.' % fname)
+                exit(-1)
+            self.digest = digest
+
+        stats_count('written_files')
+        stats_count('bytes_written', len(data))
+        return True
 
     def make_all_strings_temporary(self):
+        temp_tag = TEMP_TAG
         new_strings = []
         for string in self.strings:
-            if not string.value.startswith(TEMP_TAG.strip("'").strip('"')):
-                new_string = copy(string)
-                new_string.value = TEMP_TAG.strip("'").strip('"') + new_string.value
-                new_string.update_translation()
-                new_strings.append(new_string)
-                self.strings_d[string.key] = new_string
+            if not string.value.startswith(temp_tag):
+                string = string.with_value(temp_tag + string.value)
+            new_strings.append(string)
+            self.strings_d[string.key] = string
         self.strings = new_strings
+        self.verbatim = False
 
     def merge_with(self, new, final_filename, development_language_folder):
         global SHOULD_TRIGGER_WARNING_BECAUSE_OF_TEMP_STRINGS
-        global TEMP_WARNING_DETAILS
 
         merged = LocalizedFile()
+        merged.trailing_comments = self.trailing_comments
 
-        is_dev_language = final_filename.find(development_language_folder) != -1 or final_filename.find('Base.lproj') != -1
+        is_dev_language = is_development_language(final_filename, development_language_folder)
 
-        added_strings = []
-        translated_strings = []
-        temporary_strings = []
-        for string in new.strings:
-            if string.key not in self.strings_d:
-                new_string = copy(string)
+        # Works on whole columns: the old string of every new key (None when added), then the merged
+        #   strings and their statuses. Old strings whose comments did not change are kept as they are.
+        temp_tag = TEMP_TAG
+        strings_d = self.strings_d
+        olds = [strings_d.get(string.key) for string in new.strings]
+        merged.strings = [(string if is_dev_language else string.with_value(temp_tag + string.value)) if old is None
+                          else old if old.comments == string.comments else old.with_comments(string.comments)
+                          for string, old in zip(new.strings, olds)]
+        merged.strings_d = dict((string.key, string) for string in merged.strings)
 
-                if not is_dev_language:
-                    new_string.value = TEMP_TAG.strip("'").strip('"') + new_string.value
-                    new_string.update_translation()
-                    temporary_strings.append(new_string)
+        added_strings = [string for string, old in zip(merged.strings, olds) if old is None]
+        if is_dev_language:
+            translated_strings = [string for string, old in zip(merged.strings, olds) if old is not None]
+            temporary_strings = []
+        else:
+            is_temporary = [string.value.startswith(temp_tag) for string in merged.strings]
+            translated_strings = [string for string, temporary in zip(merged.strings, is_temporary) if not temporary]
+            temporary_strings = [string for string, temporary in zip(merged.strings, is_temporary) if temporary]
 
-                added_strings.append(new_string)
-                string = new_string
-            else:
-                old = self.strings_d[string.key]
-                new_string = copy(old)
-                new_string.comments = string.comments
+        # A merge that kept every old string in place gives back the file it was read from
+        if self.verbatim and len(added_strings) == 0 and len(merged.strings) == len(self.strings) and \
+                all(map(is_, merged.strings, self.strings)):
+            merged.fname = self.fname
+            merged.verbatim = True
 
-                if not is_dev_language:
-                    if new_string.value.startswith(TEMP_TAG.strip("'").strip('"')):
-                        temporary_strings.append(new_string)
-                    else:
-                        translated_strings.append(new_string)
+        if not is_dev_language and len(temporary_strings) != 0:
+            SHOULD_TRIGGER_WARNING_BECAUSE_OF_TEMP_STRINGS = 1
+
+        if REPORT_DATA is not None:
+            report = new_report()
+            report['added'] = [string.key for string in added_strings]
+            report['removed'] = [string.key for string in self.strings if string.key not in merged.strings_d]
+            report['temporary'] = [string.key for string in temporary_strings if string.key in self.strings_d]
+            report['translated'] = [string.key for string in translated_strings]
+            record_report(final_filename, report)
+
+        if not is_dev_language and REPORT == 'verbose':
+            # Classify the old strings in a single pass using the merged strings indexed by key
+            temporary_d = dict((string.key, string) for string in temporary_strings)
+            translated_d = dict((string.key, string) for string in translated_strings)
+
+            lines = ['    [.....Added] "%s" = "%s"' % (string.key, string.value) for string in added_strings]
+
+            if len(temporary_strings) != 0 and len(self.strings) != 0:
+                TEMP_WARNING_DETAILS.append('\n\n+ %s:\n' % final_filename)
+
+            for oldString in self.strings:
+                string = temporary_d.get(oldString.key)
+                if string is not None:
+                    data = '"%s" = "%s"' % (string.key, string.value)
+                    TEMP_WARNING_DETAILS.append('    %s\n' % data)
+                    lines.append('    [.Temporary] ' + data)
+                    continue
+
+                string = translated_d.get(oldString.key)
+                if string is not None:
+                    lines.append('    [Translated] "%s" = "%s"' % (string.key, string.value))
                 else:
-                    translated_strings.append(new_string)
+                    lines.append('    [...Removed] "%s" = "%s"' % (oldString.key, oldString.value))
 
-                string = new_string
+            if len(lines) != 0:
+                with stats_phase('report'):
+                    print('\n'.join(lines))
 
-            merged.strings.append(string)
-            merged.strings_d[string.key] = string
+        print_merge_summary(is_dev_language, len(added_strings), len(translated_strings), len(temporary_strings),
+                            len(merged.strings))
+        return merged
 
-        separator = "~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~"
-        if is_dev_language:
-            added = len(added_strings)
-            total = len(merged.strings)
 
-            print('  %s' % separator)
+def new_report():
+    return {'added': [], 'removed': [], 'temporary': [], 'translated': []}
 
-            print('  => ' + str(added) + (' string was' if len(added_strings) == 1 else ' strings were') + ' added' \
-                  ' [Total: ' + str(total) + ']')
-            print('  => All strings are automatically marked as translated')
 
-        else:
-            # Show Added/Removed strings print statements
-            show_once = 1
+def report_location(fname):
+    # Reports are grouped by locale (the .lproj folder) and table
+    return os.path.splitext(os.path.basename(os.path.dirname(fname)))[0], os.path.splitext(os.path.basename(fname))[0]
 
-            for string in added_strings:
-                print('    [.....Added] "%s" = "%s"' % (string.key.encode('utf-8', errors='ignore'), string.value.encode('utf-8', errors='ignore')))
 
-            if len(temporary_strings) != 0:
-                SHOULD_TRIGGER_WARNING_BECAUSE_OF_TEMP_STRINGS = 1
+def record_report(fname, report):
+    locale, table = report_location(fname)
+    REPORT_DATA.setdefault(locale, {})[table] = report
 
-            for oldString in self.strings:
-                try:
-                    if show_once and len(temporary_strings) > 0:
-                        TEMP_WARNING_DETAILS = TEMP_WARNING_DETAILS + '\n\n+ %s:\n' % final_filename.encode('utf-8', errors='ignore')
-                        show_once = 0
 
-                    found = 0
+def recorded_report(fname):
+    locale, table = report_location(fname)
+    return REPORT_DATA.get(locale, {}).get(table) if REPORT_DATA is not None else None
 
-                    for string in temporary_strings:
-                        if oldString.key == string.key:
-                            data = '"%s" = "%s"' % (string.key.encode('utf-8', errors='ignore'), string.value.encode('utf-8', errors='ignore'))
-                            TEMP_WARNING_DETAILS = TEMP_WARNING_DETAILS + '    ' + data.encode('utf-8', errors='ignore')
 
-                            print('    [.Temporary] ' + data.encode('utf-8', errors='ignore'))
-                            found = 1
-                            break
+def write_report(path):
+    # Written at once at the end of the run, next to the extraction cache. With --check it is
+    #   printed instead.
+    data = json.dumps({'version': SCRIPT_VERSION, 'locales': REPORT_DATA}, indent=2, sort_keys=True)
+    if CHECK_ONLY:
+        print(data + '\n')
+        return
 
-                    TEMP_WARNING_DETAILS = TEMP_WARNING_DETAILS + '\n'
+    report_fname = os.path.join(path, CACHE_FOLDER, REPORT_FILE)
+    os.makedirs(os.path.dirname(report_fname), exist_ok=True)
+    with open(report_fname, encoding='utf_8', mode='w') as f:
+        f.write(data + '\n')
+    print('Report written to %s\n' % report_fname)
 
-                    for string in translated_strings:
-                        if oldString.key == string.key:
-                            print('    [Translated] "%s" = "%s"' % (string.key.encode('utf-8', errors='ignore'), string.value.encode('utf-8', errors='ignore')))
-                            found = 1
-                            break
-                    if not found:
-                        print('    [...Removed] "%s" = "%s"' % (oldString.key.encode('utf-8', errors='ignore'), oldString.value.encode('utf-8', errors='ignore')))
 
-                except Exception as e:
-                    print('Failed to print string. Error: ' + str(e))
-                    quit(-404)
+def record_coverage(path, development_language_folder):
+    # Adds the statuses of the run to the coverage store, so --coverage can answer without reading
+    #   any .strings file
+    import sqlite3
+
+    coverage_fname = os.path.join(path, CACHE_FOLDER, COVERAGE_FILE)
+    os.makedirs(os.path.dirname(coverage_fname), exist_ok=True)
 
-            print('\n  %s' % separator)
+    connection = sqlite3.connect(coverage_fname)
+    try:
+        with connection:
+            connection.executescript(COVERAGE_SCHEMA)
+            run = connection.execute('INSERT INTO runs (time) VALUES (?)', (time(),)).lastrowid
+
+            for locale, tables in REPORT_DATA.items():
+                is_dev_language = is_development_language(locale + LPROJ_EXTENSION, development_language_folder)
+                added_status = 'translated' if is_dev_language else 'temporary'
+
+                for table, report in tables.items():
+                    statuses = [(key, added_status) for key in report['added']]
+                    statuses.extend((key, 'temporary') for key in report['temporary'])
+                    statuses.extend((key, 'translated') for key in report['translated'])
+
+                    connection.executemany(
+                        'INSERT INTO key_status VALUES (?, ?, ?, ?, ?, ?) '
+                        'ON CONFLICT (locale, table_name, key) DO UPDATE SET '
+                        'since_run = CASE WHEN status = excluded.status THEN since_run ELSE excluded.since_run END, '
+                        'status = excluded.status, last_run = excluded.last_run',
+                        [(locale, table, key, status, run, run) for key, status in statuses])
+                    connection.execute('DELETE FROM key_status WHERE locale = ? AND table_name = ? AND last_run != ?',
+                                       (locale, table, run))
+
+                    temporary = sum(1 for _, status in statuses if status == 'temporary')
+                    connection.execute('INSERT INTO coverage VALUES (?, ?, ?, ?, ?, ?)',
+                                       (run, locale, table, len(statuses), len(statuses) - temporary, temporary))
+    finally:
+        connection.close()
+
+
+def print_coverage(path, limit=COVERAGE_LIMIT):
+    # Answers --coverage from the store: the latest coverage of every locale and the keys that have
+    #   been temporary the longest
+    import sqlite3
+
+    coverage_fname = os.path.join(path, CACHE_FOLDER, COVERAGE_FILE)
+    if not os.path.isfile(coverage_fname):
+        print('- No coverage recorded yet, run the script with --record-coverage first -\n')
+        quit(-7)
+
+    connection = sqlite3.connect(coverage_fname)
+    try:
+        latest = connection.execute('SELECT MAX(id), COUNT(*) FROM runs').fetchone()
+        print('Coverage recorded over %d runs\n' % latest[1])
 
-            translated = len(translated_strings)
-            total = len(merged.strings)
-            left = total-translated
+        rows = connection.execute('SELECT locale, table_name, total, translated, temporary FROM coverage '
+                                  'WHERE run = (SELECT MAX(run) FROM coverage) ORDER BY locale, table_name').fetchall()
+        for locale, table, total, translated, temporary in rows:
             percentage = int(translated*100/total) if total != 0 else 0
-            temporary = len(temporary_strings)
-            temporary_total = total
-            percentage_temporary = int(temporary*100/temporary_total) if temporary_total != 0 else 0
-            extra = '' if percentage == 100 else ('  => ' + str(left) + ' more ' + ('string' if left == 1 else 'strings') + ' left to translate')
-            conjugation = 'has' if translated == 1 else 'have'
+            percentage_temporary = int(temporary*100/total) if total != 0 else 0
+            print('+ %s/%s%s: %d%% translated, %d%% temporary [Total: %d]' %
+                  (locale + LPROJ_EXTENSION, table, STRINGS_EXTENSION, percentage, percentage_temporary, total))
 
-            extra_temp_part = ' but ' + str(percentage_temporary) + '% are still temporary strings' if percentage_temporary != 0 else ''
+            oldest = connection.execute(
+                'SELECT key, since_run, time FROM key_status JOIN runs ON runs.id = since_run '
+                'WHERE locale = ? AND table_name = ? AND status = \'temporary\' ORDER BY since_run LIMIT ?',
+                (locale, table, limit)).fetchall()
+            for key, since_run, since in oldest:
+                print('    [.Temporary] "%s" since %s (%d runs)' %
+                      (key, strftime('%Y-%m-%d %H:%M', localtime(since)), latest[0] - since_run + 1))
+            print('')
+    finally:
+        connection.close()
+
+
+def is_development_language(fname, development_language_folder):
+    return fname.find(development_language_folder) != -1 or fname.find('Base.lproj') != -1
+
+
+def print_merge_summary(is_dev_language, added, translated, temporary, total):
+    separator = "~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~"
+    if is_dev_language:
+        print('  %s' % separator)
+
+        print('  => ' + str(added) + (' string was' if added == 1 else ' strings were') + ' added' \
+              ' [Total: ' + str(total) + ']')
+        print('  => All strings are automatically marked as translated')
+
+    else:
+        print('\n  %s' % separator)
+
+        left = total-translated
+        percentage = int(translated*100/total) if total != 0 else 0
+        temporary_total = total
+        percentage_temporary = int(temporary*100/temporary_total) if temporary_total != 0 else 0
+        extra = '' if percentage == 100 else ('  => ' + str(left) + ' more ' + ('string' if left == 1 else 'strings') + ' left to translate')
+        conjugation = 'has' if translated == 1 else 'have'
+
+        extra_temp_part = ' but ' + str(percentage_temporary) + '% are still temporary strings' if percentage_temporary != 0 else ''
+
+        print('  => ' + str(translated) + ' ' + ('string' if translated == 1 else 'strings') + ' ' + conjugation +
+              ' been translated [Total: ' + str(total) + ']')
+        print('  => ' + str(percentage) + '% of all strings were translated' + extra_temp_part)
+        print(extra) if len(extra) != 0 else []
+
+    print('\n')
 
-            print('  => ' + str(translated) + ' ' + ('string' if translated == 1 else 'strings') + ' ' + conjugation +
-                  ' been translated [Total: ' + str(total) + ']')
-            print('  => ' + str(percentage) + '% of all strings were translated' + extra_temp_part)
-            print(extra) if len(extra) != 0 else []
 
-        print('\n')
-        return merged
 
+def decode_strings_data(data):
+    # Sniffs the encoding from the BOM, falling back to UTF-8 and then to UTF-16 without a BOM.
+    #   Returns None when the data is not text.
+    if data.startswith(BOM_UTF8):
+        return data[len(BOM_UTF8):].decode('utf_8', errors='replace')
+    if data.startswith(BOM_UTF16_LE) or data.startswith(BOM_UTF16_BE):
+        return data.decode('utf_16', errors='replace')
 
-def merge(merged_fname, old_fname, new_fname, development_language_folder):
-    old = None
     try:
-        old = LocalizedFile(old_fname, auto_read=True)
+        return data.decode('utf_8')
+    except UnicodeDecodeError:
+        pass
+
+    if len(data) % 2 == 0 and data.count(b'\x00') * 4 >= len(data):
+        encoding = 'utf_16_le' if data[1:2] == b'\x00' else 'utf_16_be'
+        try:
+            return data.decode(encoding)
+        except UnicodeDecodeError:
+            pass
+
+    return None
+
+
+def snapshot_fname(fname):
+    # language.lproj/Table.strings is snapshot in .update_strings_cache/strings/language.lproj.Table.strings.bin
+    language = os.path.dirname(fname)
+    return os.path.join(os.path.dirname(language), CACHE_FOLDER, SNAPSHOT_FOLDER,
+                        os.path.basename(language) + '.' + os.path.basename(fname) + SNAPSHOT_EXTENSION)
+
+
+def load_strings_snapshot(fname):
+    # Returns the header of the snapshot and its strings, still encoded, or None when there is no
+    #   usable snapshot
+    try:
+        with open(snapshot_fname(fname), mode='rb') as f:
+            data = f.read()
+        magic, version, size, mtime, digest, verbatim, racy, count = SNAPSHOT_HEADER.unpack_from(data)
+    except:
+        return None
+
+    if magic != SNAPSHOT_MAGIC or version != SNAPSHOT_FORMAT:
+        return None
+    return {'size': size, 'mtime': mtime, 'hash': digest, 'verbatim': verbatim, 'racy': racy, 'count': count,
+            'data': memoryview(data)[SNAPSHOT_HEADER.size:]}
+
+
+def localized_file_from_snapshot(fname, snapshot):
+    # Every string is stored as its comments, key, value and translation line (empty when it is
+    #   rebuilt), separated by NUL characters, so one decode and one split give all the fields
+    fields = str(snapshot['data'], 'utf_8').split('\x00') if snapshot['count'] != 0 else []
+    if len(fields) != snapshot['count'] * 4:
+        return None
+
+    localized_file = LocalizedFile(fname)
+    localized_file.strings = [LocalizedString([comments] if comments else [], translation or None, key, value)
+                              for comments, key, value, translation
+                              in zip(fields[0::4], fields[1::4], fields[2::4], fields[3::4])]
+    localized_file.strings_d = dict(zip(fields[1::4], localized_file.strings))
+    localized_file.verbatim = bool(snapshot['verbatim'])
+    return localized_file
+
+
+def save_strings_snapshot(fname, stat, digest, localized_file, read_time):
+    # read_time is when the snapshot content was read from, or written to, the file
+    fields = []
+    for string in localized_file.strings:
+        fields.extend((u''.join(string.comments), string.key, string.value, string._translation or ''))
+    data = u'\x00'.join(fields)
+    # Files containing NUL characters or trailing comments are not snapshot
+    if (len(fields) != 0 and data.count(u'\x00') != len(fields) - 1) or localized_file.trailing_comments:
+        return
+
+    header = SNAPSHOT_HEADER.pack(SNAPSHOT_MAGIC, SNAPSHOT_FORMAT, stat.st_size, stat.st_mtime_ns, digest,
+                                  localized_file.verbatim, is_racy(stat, read_time), len(localized_file.strings))
+
+    cache_fname = snapshot_fname(fname)
+    os.makedirs(os.path.dirname(cache_fname), exist_ok=True)
+    temporary_fname = cache_fname + '.new'
+    with open(temporary_fname, mode='wb') as f:
+        f.write(header + data.encode('utf_8'))
+    os.replace(temporary_fname, cache_fname)
+
+
+def read_strings_file(fname):
+    # Returns the parsed file (empty when it cannot be parsed), or None when it is empty or not text.
+    #   In --watch mode files that did not change since the last run are not parsed again, and files
+    #   that did not change since they were snapshot in the cache folder are loaded from the snapshot.
+    if WATCH_STATE is not None:
+        old = WATCH_STATE.cached_model(fname)
+        if old is not None:
+            return old
+
+    with stats_phase('read'):
+        stat = os.stat(fname)
+        snapshot = load_strings_snapshot(fname) if USE_CACHE else None
+
+        read_time = time()
+        data = None
+        if not is_cache_record_fresh(stat, snapshot):
+            with open(fname, mode='rb') as f:
+                data = f.read()
+            stats_count('bytes_read', len(data))
+    digest = hashlib.sha1(data).digest() if data is not None else None
+
+    if snapshot is not None and (data is None or snapshot['hash'] == digest):
+        with stats_phase('load_snapshot'):
+            old = localized_file_from_snapshot(fname, snapshot)
+        if old is not None:
+            stats_count('snapshot_files')
+            if data is not None and not CHECK_ONLY and not is_racy(stat, read_time):
+                # Checked against the file, so the next runs can trust its size and mtime
+                try:
+                    save_strings_snapshot(fname, stat, digest, old, read_time)
+                except Exception as e:
+                    print('Failed saving the snapshot of %s with error %s' % (fname, str(e)))
+            if WATCH_STATE is not None:
+                WATCH_STATE.cache_model(fname, old)
+            return old
+
+        if data is None:
+            with open(fname, mode='rb') as f:
+                data = f.read()
+            digest = hashlib.sha1(data).digest()
+
+    text = decode_strings_data(data) if len(data) != 0 else None
+    if text is None:
+        return None
+
+    old = LocalizedFile(fname)
+    try:
+        with stats_phase('parse'):
+            old.parse(text)
+        old.verbatim = old.verbatim and text.encode('utf_8') == data
     except:
         old = LocalizedFile()
+    else:
+        if USE_CACHE and not CHECK_ONLY:
+            try:
+                save_strings_snapshot(fname, stat, digest, old, read_time)
+            except Exception as e:
+                print('Failed saving the snapshot of %s with error %s' % (fname, str(e)))
+
+    if WATCH_STATE is not None:
+        WATCH_STATE.cache_model(fname, old)
+    return old
 
-    new = LocalizedFile(new_fname, auto_read=True)
-    merged = old.merge_with(new, merged_fname, development_language_folder)
-    merged.save_to_file(merged_fname)
 
+def merge(merged_fname, old, new, development_language_folder):
+    # Returns whether the merged file was written
+    with stats_phase('merge'):
+        merged = old.merge_with(new, merged_fname, development_language_folder)
+    stats_count('strings', len(merged.strings))
+    written = merged.save_to_file(merged_fname)
 
-def initialize_file_from(fname, new_fname, development_language_folder):
-    is_dev_language = new_fname.find(development_language_folder) != -1 or new_fname.find('Base.lproj') != -1
+    if written and not CHECK_ONLY:
+        # The written file is exactly the merged strings, so the next run does not parse it
+        merged.fname = merged_fname
+        merged.verbatim = True
+        if USE_CACHE:
+            try:
+                save_strings_snapshot(merged_fname, os.stat(merged_fname), merged.digest, merged, time())
+            except Exception as e:
+                print('Failed saving the snapshot of %s with error %s' % (merged_fname, str(e)))
+
+    if WATCH_STATE is not None and not CHECK_ONLY:
+        WATCH_STATE.cache_model(merged_fname, merged)
+    return written
+
+
+def index_strings_data(data):
+    # Maps every key of a UTF-8 .strings buffer to the offsets of its value and of its translation
+    #   line, in file order. Returns None when the buffer is not a valid UTF-8 .strings file or
+    #   repeats a key, which are left to the in-memory merge.
+    index = {}
+    position = len(BOM_UTF8) if data[:len(BOM_UTF8)] == BOM_UTF8 else 0
+    for entry in re_strings_entry_bytes.finditer(data, position):
+        if entry.start() != position:
+            return None
+        position = entry.end()
+        try:
+            # The whole entry is checked, as its comments and translation line are copied as is
+            entry.group(0).decode('utf_8')
+        except UnicodeDecodeError:
+            return None
+        key = entry.group(2).decode('utf_8')
+        if key in index:
+            return None
+        index[key] = (entry.start(3), entry.end(3), entry.end(1), position)
+
+    # Trailing comments are only kept by the in-memory merge
+    if len(data[position:].strip()) != 0:
+        return None
+    return index
+
+
+def stream_merge(merged_fname, new, development_language_folder):
+    # Same result and report as merge, but the old file is memory mapped and only its keys are
+    #   indexed: values are read from the map when needed and the merged entries are written one by
+    #   one. Returns whether the merged file was written, or None when the file has to be merged in
+    #   memory instead (empty, UTF-16 or not parsable in one pass).
+    global SHOULD_TRIGGER_WARNING_BECAUSE_OF_TEMP_STRINGS
+    import mmap
+
+    with open(merged_fname, mode='rb') as f:
+        if os.fstat(f.fileno()).st_size == 0:
+            return None
+        data = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+    temporary_fname = merged_fname + '.new'
+    try:
+        if data[:2] in (BOM_UTF16_LE, BOM_UTF16_BE):
+            return None
+        with stats_phase('parse'):
+            index = index_strings_data(data)
+        if index is None:
+            return None
+        stats_count('bytes_read', len(data))
+
+        is_dev_language = is_development_language(merged_fname, development_language_folder)
+        temp_tag = TEMP_TAG
+        added = translated = temporary = 0
+        size = 0
+        digest = hashlib.sha1()
+        verbose = REPORT == 'verbose'
+        report = new_report() if REPORT_DATA is not None else None
+
+        with stats_phase('merge'):
+            output = None if CHECK_ONLY else open(temporary_fname, mode='wb')
+            try:
+                for string in new.strings:
+                    offsets = index.get(string.key)
+                    if offsets is None:
+                        added += 1
+                        if not is_dev_language:
+                            string = string.with_value(temp_tag + string.value)
+                            temporary += 1
+                            if verbose:
+                                print('    [.....Added] "%s" = "%s"' % (string.key, string.value))
+                        if report is not None:
+                            report['added'].append(string.key)
+                        chunk = string.__unicode__().encode('utf_8')
+                    else:
+                        if is_dev_language or not data[offsets[0]:offsets[1]].decode('utf_8').startswith(temp_tag):
+                            translated += 1
+                            if report is not None:
+                                report['translated'].append(string.key)
+                        else:
+                            temporary += 1
+                            if report is not None:
+                                report['temporary'].append(string.key)
+                        chunk = u''.join(string.comments).encode('utf_8') + data[offsets[2]:offsets[3]] + b'\n\n'
+
+                    digest.update(chunk)
+                    size += len(chunk)
+                    if output is not None:
+                        output.write(chunk)
+            finally:
+                if output is not None:
+                    output.close()
+
+        if not is_dev_language and temporary != 0:
+            SHOULD_TRIGGER_WARNING_BECAUSE_OF_TEMP_STRINGS = 1
+
+        if report is not None:
+            new_d = new.strings_d
+            report['removed'] = [key for key in index if key not in new_d]
+            record_report(merged_fname, report)
+
+        if not is_dev_language and verbose:
+            if temporary != 0 and len(index) != 0:
+                TEMP_WARNING_DETAILS.append('\n\n+ %s:\n' % merged_fname)
+
+            with stats_phase('report'):
+                new_d = new.strings_d
+                for key, offsets in index.items():
+                    value = data[offsets[0]:offsets[1]].decode('utf_8')
+                    line = '"%s" = "%s"' % (key, value)
+                    if key not in new_d:
+                        print('    [...Removed] ' + line)
+                    elif value.startswith(temp_tag):
+                        TEMP_WARNING_DETAILS.append('    %s\n' % line)
+                        print('    [.Temporary] ' + line)
+                    else:
+                        print('    [Translated] ' + line)
+
+        print_merge_summary(is_dev_language, added, translated, temporary, len(new.strings))
+        stats_count('strings', len(new.strings))
+
+        unchanged = size == len(data) and digest.digest() == hashlib.sha1(data).digest()
+    finally:
+        data.close()
+
+    with stats_phase('save'):
+        if unchanged:
+            if not CHECK_ONLY:
+                os.remove(temporary_fname)
+            stats_count('unchanged_files')
+            return False
+
+        if CHECK_ONLY:
+            print('    %s is out of date.' % merged_fname)
+            stats_count('outdated_files')
+            return True
+
+        os.replace(temporary_fname, merged_fname)
+
+    stats_count('written_files')
+    stats_count('bytes_written', size)
+    return True
+
+
+def initialize_file_from(new, new_fname, development_language_folder):
+    is_dev_language = is_development_language(new_fname, development_language_folder)
+    initialized = LocalizedFile()
+    initialized.strings = list(new.strings)
+    initialized.strings_d = dict(new.strings_d)
     if not is_dev_language:
-        new = LocalizedFile(fname, auto_read=True)
-        new.make_all_strings_temporary()
-        new.save_to_file(new_fname)
+        initialized.make_all_strings_temporary()
+    initialized.save_to_file(new_fname)
+
+
+def literal_from_tokens(tokens):
+    # Only string literals, or adjacent Objective-C literals, are extracted. Anything else, operators
+    #   included, is computed at runtime.
+    if len(tokens) == 0:
+        return None
+
+    parts = []
+    for kind, text in tokens:
+        if kind != 'string':
+            return None
+        parts.append(text[2:-1] if text.startswith('@') else text[1:-1])
+
+    return ''.join(parts)
+
+
+def entries_from_call(layout, arguments):
+    fields = {}
+    position = 0
+    for argument in arguments:
+        if len(argument) > 2 and argument[0][0] == 'name' and argument[1][1] == ':':
+            field = ROUTINE_LABELS.get(argument[0][1])
+            argument = argument[2:]
+        else:
+            field = layout[position] if position < len(layout) else None
+            position += 1
+
+        if field is not None:
+            fields[field] = literal_from_tokens(argument)
+
+    key = fields.get('key')
+    if not key:
+        return None
+
+    # The table is joined into the path of its .strings file, so it must stay inside the *.lproj folder
+    table = fields.get('table') or DEFAULT_TABLE
+    if '/' in table or '..' in table:
+        return None
+
+    return (table,
+            key,
+            fields.get('value') or key,
+            fields.get('comment') or DEFAULT_COMMENT)
+
+
+def source_tokens(text):
+    # Comments and white space are dropped. The code of Swift string interpolations is tokenized
+    #   too, so the calls it contains are extracted, and the literal around it becomes
+    #   'interpolation' tokens, which are never used as a key.
+    tokens = []
+    # Parentheses depth and kind of literal of every open interpolation
+    interpolations = []
+    position = 0
+    while True:
+        for match in re_source_token.finditer(text, position):
+            kind = match.lastgroup
+            token = match.group(kind)
+            if kind == 'comment' or (kind == 'other' and token.isspace()):
+                continue
+
+            if kind == 'punctuation' and len(interpolations) != 0:
+                if token == '(':
+                    interpolations[-1][0] += 1
+                elif token == ')':
+                    if interpolations[-1][0] == 0:
+                        # Back in the literal, which is scanned on its own
+                        literal = interpolations.pop()[1]
+                        rest = re_source_string_rest[literal].match(text, match.end())
+                        if rest.group(0).endswith('\\('):
+                            interpolations.append([0, literal])
+                        position = rest.end()
+                        break
+                    interpolations[-1][0] -= 1
+            elif kind in re_source_string_rest and token.endswith('\\('):
+                kind = 'interpolation'
+                interpolations.append([0, match.lastgroup])
+
+            tokens.append((kind, token))
+        else:
+            return tokens
+
+
+def extract_strings_from_text(text, routine):
+    entries = []
+    if routine not in text:
+        return entries
+
+    routines = dict((routine + suffix, layout) for suffix, layout in ROUTINE_VARIANTS.items())
+    tokens = source_tokens(text)
+
+    index = 0
+    count = len(tokens)
+    while index < count:
+        kind, token = tokens[index]
+        index += 1
+        if kind != 'name' or token not in routines or index >= count or tokens[index][1] != '(':
+            continue
+
+        # Split the call arguments on top level commas
+        layout = routines[token]
+        arguments = [[]]
+        depth = 0
+        index += 1
+        start = index
+        while index < count:
+            kind, token = tokens[index]
+            if kind == 'punctuation':
+                if token in '([{':
+                    depth += 1
+                elif token in ')]}':
+                    if depth == 0:
+                        break
+                    depth -= 1
+                elif token == ',' and depth == 0:
+                    arguments.append([])
+                    index += 1
+                    continue
+            arguments[-1].append((kind, token))
+            index += 1
+
+        entry = entries_from_call(layout, arguments)
+        if entry is not None:
+            entries.append(entry)
+        # The arguments are scanned again for the calls they contain
+        index = start
+
+    return entries
+
+
+def is_racy(stat, read_time):
+    # A file read (or written) within the mtime tick it was modified in may change again without
+    #   changing its size and mtime, so a record of it is only trusted once its hash was checked
+    return read_time - stat.st_mtime <= CACHE_MTIME_GRACE
+
+
+def is_cache_record_fresh(stat, cached):
+    # Records without the racy flag are hashed too
+    return cached is not None and not cached.get('racy', True) and cached['size'] == stat.st_size \
+        and cached['mtime'] == stat.st_mtime_ns
+
+
+def extract_strings_from_file(fname, routine, cached=None):
+    # Returns the cache record of the file, reusing the cached entries when the file is unchanged
+    stat = os.stat(fname)
+    if is_cache_record_fresh(stat, cached):
+        return cached
+
+    read_time = time()
+    with open(fname, mode='rb') as f:
+        data = f.read()
+
+    digest = hashlib.sha1(data).hexdigest()
+    if cached is not None and cached['hash'] == digest:
+        entries = cached['entries']
     else:
-        os.rename(fname, new_fname)
+        entries = extract_strings_from_text(data.decode('utf_8', errors='replace'), routine)
+
+    return {'size': stat.st_size, 'mtime': stat.st_mtime_ns, 'hash': digest, 'racy': is_racy(stat, read_time),
+            'entries': entries}
+
+
+def load_extraction_cache(cache_fname, routine):
+    try:
+        with open(cache_fname, encoding='utf_8', mode='r') as f:
+            cache = json.load(f)
+    except:
+        return {}
+
+    # Entries extracted by another version of the script or for another routine are not reusable
+    if cache.get('version') != SCRIPT_VERSION or cache.get('routine') != routine:
+        return {}
+
+    return cache.get('files', {})
+
+
+def save_extraction_cache(cache_fname, routine, files):
+    os.makedirs(os.path.dirname(cache_fname), exist_ok=True)
+
+    temporary_fname = cache_fname + '.new'
+    with open(temporary_fname, encoding='utf_8', mode='w') as f:
+        json.dump({'version': SCRIPT_VERSION, 'routine': routine, 'files': files}, f)
+    os.replace(temporary_fname, cache_fname)
+
+
+def walk_project(path):
+    # Returns the source files under path and the folders that contain *.lproj folders
+    source_files = []
+    project_roots = []
+    for root, folders, files in os.walk(path):
+        if CACHE_FOLDER in folders:
+            folders.remove(CACHE_FOLDER)
+        folders.sort()
+        if any(folder.endswith(LPROJ_EXTENSION) for folder in folders):
+            project_roots.append(root)
+        for name in sorted(files):
+            if name.endswith(SOURCE_EXTENSIONS):
+                source_files.append(os.path.join(root, name))
+    return source_files, project_roots
+
+
+def find_source_files(path):
+    if BATCH_STATE is not None:
+        source_files = BATCH_STATE.find_source_files(path)
+        if source_files is not None:
+            return source_files
+    return walk_project(path)[0]
+
+
+def build_localized_files(entries):
+    # Mirrors the genstrings output: one file per table, keys sorted, comments of duplicated
+    #   keys gathered in a single comment block
+    tables = {}
+    for table, key, value, comment in entries:
+        keys = tables.setdefault(table, {})
+        if key not in keys:
+            keys[key] = (value, [comment])
+        elif comment not in keys[key][1]:
+            keys[key][1].append(comment)
+
+    localized_files = {}
+    for table, keys in tables.items():
+        localized_file = LocalizedFile()
+        for key in sorted(keys):
+            value, comments = keys[key]
+            lines = ['   %s\n' % comment for comment in comments]
+            lines[0] = '/* %s\n' % comments[0]
+            lines[-1] = lines[-1][:-1] + ' */\n'
+            string = LocalizedString(lines, None, key, value)
+            localized_file.strings.append(string)
+            localized_file.strings_d[string.key] = string
+        localized_files[table] = localized_file
+
+    return localized_files
+
+
+def extract_strings(path, routine, executor=None):
+    # Extraction does not depend on the language, so it runs once per project and the resulting
+    #   file is merged into every *.lproj folder afterwards
+    cache_fname = os.path.join(path, CACHE_FOLDER, EXTRACTION_CACHE_FILE)
+    if WATCH_STATE is not None and WATCH_STATE.source_records is not None:
+        cached_files = WATCH_STATE.source_records
+    else:
+        cached_files = load_extraction_cache(cache_fname, routine) if USE_CACHE else {}
+
+    with stats_phase('find_sources'):
+        source_files = find_source_files(path)
+    stats_count('source_files', len(source_files))
+
+    files = {}
+    pending = []
+    for fname in source_files:
+        relative_fname = os.path.relpath(fname, path)
+        shared = BATCH_STATE.records.get(fname) if BATCH_STATE is not None else None
+        if shared is not None:
+            # Already scanned for another project of the batch
+            files[relative_fname] = shared
+            continue
+
+        cached = cached_files.get(relative_fname)
+        if executor is not None and not is_cache_record_fresh(os.stat(fname), cached):
+            files[relative_fname] = None
+            pending.append((relative_fname, fname, cached))
+        else:
+            files[relative_fname] = record = extract_strings_from_file(fname, routine, cached)
+            if record is not cached:
+                stats_count('scanned_source_files')
+
+    if len(pending) != 0:
+        chunksize = max(1, len(pending) // (JOBS * 4))
+        records = executor.map(extract_strings_from_file, [fname for _, fname, _ in pending],
+                               repeat(routine), [cached for _, _, cached in pending], chunksize=chunksize)
+        for (relative_fname, _, _), record in zip(pending, records):
+            files[relative_fname] = record
+        stats_count('scanned_source_files', len(pending))
+
+    if BATCH_STATE is not None:
+        BATCH_STATE.records.update((os.path.join(path, relative_fname), record) for relative_fname, record in files.items())
+
+    if WATCH_STATE is not None:
+        # The extracted tables are reused as they are while no source file changed
+        if files == cached_files and WATCH_STATE.extracted is not None:
+            return WATCH_STATE.extracted
+        WATCH_STATE.source_records = files
+
+    entries = []
+    for record in files.values():
+        entries.extend(tuple(entry) for entry in record['entries'])
+
+    if USE_CACHE and not CHECK_ONLY and files != cached_files:
+        try:
+            save_extraction_cache(cache_fname, routine, files)
+        except Exception as e:
+            print('Failed saving the extraction cache with error ' + str(e))
+
+    # Localizable.strings is always kept up to date, even when no string uses it anymore
+    extracted = build_localized_files(entries)
+    extracted.setdefault(DEFAULT_TABLE, LocalizedFile())
+    stats_count('extracted_strings', sum(len(table.strings) for table in extracted.values()))
+
+    if WATCH_STATE is not None:
+        WATCH_STATE.extracted = extracted
+    return extracted
+
+
+def sorted_tables(extracted):
+    return sorted(extracted, key=lambda table: (table != DEFAULT_TABLE, table))
+
+
+def localize_language(language, extracted, development_language_folder):
+    if STATS is None:
+        return localize_single_language(language, extracted, development_language_folder)
+
+    STATS.locale = language
+    try:
+        with STATS.phase('localize_language'):
+            return localize_single_language(language, extracted, development_language_folder)
+    finally:
+        STATS.locale = None
+
+
+def table_id(language, table):
+    return os.path.join(os.path.dirname(language), table)
+
+
+def localize_single_language(language, extracted, development_language_folder):
+    # Every table found in the source code is merged into its own .strings file
+    global SHOULD_TRIGGER_WARNING_BECAUSE_OF_TEMP_STRINGS
+
+    for table in sorted_tables(extracted):
+        should_trigger_warning = SHOULD_TRIGGER_WARNING_BECAUSE_OF_TEMP_STRINGS
+        SHOULD_TRIGGER_WARNING_BECAUSE_OF_TEMP_STRINGS = 0
+
+        if WATCH_STATE is not None:
+            WATCH_STATE.localize_table(language, table, extracted[table], development_language_folder)
+        else:
+            localize_table(language, table, extracted[table], development_language_folder)
+
+        if SHOULD_TRIGGER_WARNING_BECAUSE_OF_TEMP_STRINGS:
+            TEMP_STRINGS_TABLES.add(table_id(language, table))
+        SHOULD_TRIGGER_WARNING_BECAUSE_OF_TEMP_STRINGS = should_trigger_warning or SHOULD_TRIGGER_WARNING_BECAUSE_OF_TEMP_STRINGS
+
+
+def localize_table(language, table, extracted, development_language_folder):
+    # Returns whether an existing file was merged without changing it
+    strings_file = table + STRINGS_EXTENSION
+    print('+ ' + language + '/' + strings_file + '\n')
+
+    original = os.path.join(language, strings_file)
+    old = original + '.old'
+    new = original + '.new'
+    invalid = original + '.invalid'
+
+    try:
+        # Clean junk files left by interrupted runs
+        if not CHECK_ONLY:
+            if os.path.isfile(old):
+                os.remove(old)
+            if os.path.isfile(new):
+                os.remove(new)
+
+        if os.path.isfile(original):
+            if STREAM_MERGE:
+                try:
+                    written = stream_merge(original, extracted, development_language_folder)
+                except Exception as e:
+                    print('Failed merging files with error ' + str(e))
+
+                    if not CHECK_ONLY and os.path.isfile(new):
+                        os.remove(new)
+
+                    quit(-254)
+
+                if written is not None:
+                    return not written
+
+            old_strings = read_strings_file(original)
+            if old_strings is not None:
+                # The original is only replaced once the merged file is completely written, so
+                #   there is nothing to restore when the merge fails
+                try:
+                    return not merge(original, old_strings, extracted, development_language_folder)
+
+                except Exception as e:
+                    print('Failed merging files with error ' + str(e))
+
+                    if not CHECK_ONLY and os.path.isfile(new):
+                        os.remove(new)
+
+                    quit(-254)
+
+            else:
+                if CHECK_ONLY:
+                    pass
+                elif os.path.getsize(original) == 0:
+                    os.remove(original)
+                else:
+                    os.rename(original, invalid)
+
+                extracted.save_to_file(original)
+
+        else:
+            INITIALIZED_TABLES.add(table_id(language, table))
+
+            if not CHECK_ONLY:
+                print('    Generated a new %s file from source code.' % strings_file)
+
+            initialize_file_from(extracted, original, development_language_folder)
+
+            if REPORT_DATA is not None:
+                report = new_report()
+                report['added'] = [string.key for string in extracted.strings]
+                record_report(original, report)
+
+    except Exception as e:
+        print('Failed processing files with error ' + str(e))
+
+        quit(-254)
+
+    return False
+
+
+def apply_worker_options(options):
+    # Initializer of the worker processes
+    globals().update(options)
+
+
+def create_executor():
+    from concurrent.futures import ProcessPoolExecutor
+    stats_count('process_spawns', JOBS)
+    return ProcessPoolExecutor(max_workers=JOBS, initializer=apply_worker_options,
+                               initargs=(dict((name, globals()[name]) for name in WORKER_OPTIONS),))
+
+
+def localize_language_job(language, extracted, development_language_folder, collect_stats):
+    # Runs localize_language in a worker process and hands its console output, global state and
+    #   stats back, so the parent can replay them in the same order as the serial mode
+    global INITIALIZED_TABLES
+    global TEMP_STRINGS_TABLES
+    global SHOULD_TRIGGER_WARNING_BECAUSE_OF_TEMP_STRINGS
+    global TEMP_WARNING_DETAILS
+    global STATS
+    global REPORT_DATA
+
+    INITIALIZED_TABLES = set()
+    TEMP_STRINGS_TABLES = set()
+    SHOULD_TRIGGER_WARNING_BECAUSE_OF_TEMP_STRINGS = 0
+    TEMP_WARNING_DETAILS = []
+    STATS = RunStats() if collect_stats else None
+    REPORT_DATA = {} if REPORT == 'json' or RECORD_COVERAGE else None
+
+    output = StringIO()
+    exit_code = 0
+    with redirect_stdout(output):
+        try:
+            localize_language(language, extracted, development_language_folder)
+        except SystemExit as e:
+            exit_code = e.code
+
+    locale_stats = STATS.locales.get(language) if STATS is not None else None
+    return output.getvalue(), exit_code, INITIALIZED_TABLES, TEMP_STRINGS_TABLES, \
+        SHOULD_TRIGGER_WARNING_BECAUSE_OF_TEMP_STRINGS, TEMP_WARNING_DETAILS, locale_stats, REPORT_DATA
+
+
+def localize_languages(languages, extracted, development_language_folder, executor):
+    global SHOULD_TRIGGER_WARNING_BECAUSE_OF_TEMP_STRINGS
+
+    jobs = [executor.submit(localize_language_job, language, extracted, development_language_folder, STATS is not None)
+            for language in languages]
+
+    for language, job in zip(languages, jobs):
+        output, exit_code, initialized_tables, temp_strings_tables, should_trigger_warning, temp_warning_details, \
+            locale_stats, report_data = job.result()
+
+        if locale_stats is not None:
+            STATS.add_locale(language, locale_stats)
+        if report_data is not None:
+            REPORT_DATA.update(report_data)
+
+        print(output, end='')
+        INITIALIZED_TABLES.update(initialized_tables)
+        TEMP_STRINGS_TABLES.update(temp_strings_tables)
+        SHOULD_TRIGGER_WARNING_BECAUSE_OF_TEMP_STRINGS = SHOULD_TRIGGER_WARNING_BECAUSE_OF_TEMP_STRINGS or should_trigger_warning
+        TEMP_WARNING_DETAILS.extend(temp_warning_details)
+
+        if exit_code:
+            quit(exit_code)
+
+
+def find_languages(path):
+    return [lang for lang in [os.path.join(path, name) for name in os.listdir(path)]
+            if lang.endswith(LPROJ_EXTENSION) and os.path.isdir(lang)]
 
 
 def localize_code(rawPath, customPath, routine, development_language_folder):
-    global DID_INITIALIZE
-    global IGNORE_WARN
+    global REPORT_DATA
 
     path = rawPath
     if customPath:
         path = os.path.join(path, customPath)
 
+    REPORT_DATA = {} if REPORT == 'json' or RECORD_COVERAGE else None
+
+    executor = None
+    if BATCH_STATE is not None:
+        executor = BATCH_STATE.executor
+    elif JOBS > 1 and WATCH_STATE is None:
+        executor = create_executor()
+
     try:
-        languages = [lang for lang in [os.path.join(path, name) for name in os.listdir(path)]
-                     if lang.endswith(LPROJ_EXTENSION) and os.path.isdir(lang)]
+        languages = find_languages(path)
 
         if len(languages) == 0:
             print('- No *.lproj folders detected -\n')
             quit(-253)
 
-        for language in languages:
-            print('+ ' + language + '/' + STRINGS_FILE + '\n')
+        try:
+            with stats_phase('extract'):
+                extracted = extract_strings(path, routine, executor)
+        except Exception as e:
+            print('Failed extracting strings from source code with error ' + str(e))
+
+            quit(-254)
+
+        if executor is not None:
+            localize_languages(languages, extracted, development_language_folder, executor)
+        else:
+            for language in languages:
+                localize_language(language, extracted, development_language_folder)
+
+    except KeyboardInterrupt:
+        # Stops the run, and the daemon when it happens during a refresh
+        raise
 
-            original = merged = os.path.join(language, STRINGS_FILE)
-            old = original + '.old'
-            new = original + '.new'
-            invalid = original + '.invalid'
+    except:
+        print('- No language folders present -\n')
+        quit(-255)
+
+    finally:
+        if executor is not None and BATCH_STATE is None:
+            executor.shutdown()
+
+    if REPORT == 'json':
+        write_report(path)
+    if RECORD_COVERAGE and not CHECK_ONLY:
+        with stats_phase('coverage'):
+            record_coverage(path, development_language_folder)
+
+
+class BatchState():
+    # What the projects of a batch share: a single walk of the source files, the strings extracted
+    #   from every source file scanned so far and the worker pool
+    def __init__(self, root):
+        self.root = os.path.normpath(root)
+        self.source_files, self.project_roots = walk_project(self.root)
+        self.records = {}
+        self.executor = None
+
+    def find_source_files(self, path):
+        path = os.path.normpath(path)
+        if path == self.root:
+            return self.source_files
+        if not path.startswith(self.root + os.sep):
+            return None
+        prefix = path + os.sep
+        return [fname for fname in self.source_files if fname.startswith(prefix)]
+
+
+def read_manifest(fname):
+    # One project root per line, relative to the manifest. Empty lines and # comments are ignored.
+    with open(fname, encoding='utf_8', mode='r') as f:
+        lines = [line.strip() for line in f.read().splitlines()]
+    folder = os.path.dirname(os.path.abspath(fname))
+    return [os.path.normpath(os.path.join(folder, line)) for line in lines if line != '' and not line.startswith('#')]
+
+
+def localize_projects(path, manifest_fname, routine, development_language_folder):
+    # Updates every project of the manifest, or every folder under path containing *.lproj folders,
+    #   and combines their results into the verdict of a single run
+    global BATCH_STATE
+
+    if manifest_fname is not None:
+        projects = read_manifest(manifest_fname)
+        root = os.path.commonpath(projects) if len(projects) != 0 else path
+    else:
+        projects = None
+        root = path
+
+    with stats_phase('find_sources'):
+        BATCH_STATE = BatchState(root)
+    if projects is None:
+        projects = BATCH_STATE.project_roots
+
+    if len(projects) == 0:
+        print('- No projects found -\n')
+        quit(-253)
+
+    if JOBS > 1:
+        BATCH_STATE.executor = create_executor()
+
+    try:
+        for project in projects:
+            print('* ' + project + '\n')
+
+            relative_project = os.path.relpath(project, BATCH_STATE.root)
+            localize_code(BATCH_STATE.root, '' if relative_project == '.' else relative_project, routine,
+                          development_language_folder)
+            stats_count('projects')
+    finally:
+        if BATCH_STATE.executor is not None:
+            BATCH_STATE.executor.shutdown()
+        BATCH_STATE = None
+
+
+def reset_run_state():
+    global INITIALIZED_TABLES
+    global TEMP_STRINGS_TABLES
+    global SHOULD_TRIGGER_WARNING_BECAUSE_OF_TEMP_STRINGS
+    global TEMP_WARNING_DETAILS
+
+    INITIALIZED_TABLES = set()
+    TEMP_STRINGS_TABLES = set()
+    SHOULD_TRIGGER_WARNING_BECAUSE_OF_TEMP_STRINGS = 0
+    TEMP_WARNING_DETAILS = []
+
+
+def finish_run():
+    # Prints the Xcode error/warning of the run and returns the exit code of the script
+    info_for_temp_tag = '(strings prefixed with \'' + TEMP_TAG + '\')'
+    temp_warning_details = ''.join(TEMP_WARNING_DETAILS)
+    if len(TEMP_STRINGS_TABLES - INITIALIZED_TABLES) != 0 and SHOULD_TRIGGER_ERROR_BECAUSE_OF_DEFAULT_STRINGS:
+        print('----- Xcode error -----')
+        print('error: You have strings that are not translated! Replace all temporary strings ' + info_for_temp_tag +
+              ' and add translated ones to be able to build the project without errors.%s' % temp_warning_details)
+        return -4
+
+    should_take_warn_into_account = (not IGNORE_WARN) and SHOULD_TRIGGER_WARNING_BECAUSE_OF_TEMP_STRINGS
+    if should_take_warn_into_account:
+        print('----- Xcode warning -----')
+        print('warning: There are string keys which need to be translated.%s' % temp_warning_details)
+
+        if CHECK_ONLY:
+            return -5
+
+    print('\n')
+    return 0
 
+
+def file_signature(fname):
+    try:
+        stat = os.stat(fname)
+    except OSError:
+        return None
+    return stat.st_size, stat.st_mtime_ns, stat.st_ino
+
+
+class WatchState():
+    # What --watch keeps in memory between two runs: the strings extracted from every source file,
+    #   the parsed .strings files and the console output (and --report=json keys) of tables that
+    #   did not change
+    def __init__(self):
+        self.source_records = None
+        self.extracted = None
+        self.models = {}
+        self.tables = {}
+
+    def cached_model(self, fname):
+        cached = self.models.get(fname)
+        if cached is None or cached[0] != file_signature(fname):
+            return None
+        return cached[1]
+
+    def cache_model(self, fname, model):
+        self.models[fname] = (file_signature(fname), model)
+
+    def localize_table(self, language, table, extracted, development_language_folder):
+        global SHOULD_TRIGGER_WARNING_BECAUSE_OF_TEMP_STRINGS
+        global TEMP_WARNING_DETAILS
+
+        fname = os.path.join(language, table + STRINGS_EXTENSION)
+        signature = file_signature(fname)
+
+        # A table is only merged again when its extracted strings or its file changed
+        cached = self.tables.pop(fname, None)
+        if cached is not None and cached[0] is extracted and cached[1] == signature:
+            unchanged = True
+            output, should_trigger_warning, temp_warning_details, report = cached[2]
+            print(output, end='')
+            if report is not None and REPORT_DATA is not None:
+                record_report(fname, report)
+        else:
+            previous_warning, previous_details = SHOULD_TRIGGER_WARNING_BECAUSE_OF_TEMP_STRINGS, TEMP_WARNING_DETAILS
+            SHOULD_TRIGGER_WARNING_BECAUSE_OF_TEMP_STRINGS = 0
+            TEMP_WARNING_DETAILS = []
+
+            captured = StringIO()
             try:
-                # Clean junk files
-                if os.path.isfile(old):
-                    os.remove(old)
-                if os.path.isfile(new):
-                    os.remove(new)
-
-                gen_strings_command = 'find "%s" -type f -name "*.swift" -print0 -or -name "*.m" -print0' \
-                                      ' | tr "\n" "\t" | xargs -0 xcrun extractLocStrings -q -s "%s" -o "%s"' % (path, routine, language)
-                if os.path.isfile(original):
-                    file_type = os.popen('file -b --mime-encoding "%s"' % original).read()
-                    if file_type.startswith('us-ascii') or file_type.startswith('utf'):
-                        os.rename(original, old)
-                    else:
-                        if os.stat(original).st_size == 0:
-                            os.remove(original)
-                        else:
-                            os.rename(original, invalid)
+                with redirect_stdout(captured):
+                    unchanged = localize_table(language, table, extracted, development_language_folder)
+            finally:
+                output = captured.getvalue()
+                should_trigger_warning, temp_warning_details = SHOULD_TRIGGER_WARNING_BECAUSE_OF_TEMP_STRINGS, TEMP_WARNING_DETAILS
+                SHOULD_TRIGGER_WARNING_BECAUSE_OF_TEMP_STRINGS, TEMP_WARNING_DETAILS = previous_warning, previous_details
+                print(output, end='')
+                report = recorded_report(fname)
+
+        # Tables that were written or generated are reported differently on the next run
+        if unchanged:
+            self.tables[fname] = (extracted, signature, (output, should_trigger_warning, temp_warning_details, report))
+
+        SHOULD_TRIGGER_WARNING_BECAUSE_OF_TEMP_STRINGS = SHOULD_TRIGGER_WARNING_BECAUSE_OF_TEMP_STRINGS or should_trigger_warning
+        TEMP_WARNING_DETAILS.extend(temp_warning_details)
+
+
+def daemon_socket_fname(path):
+    # Kept out of the project, as unix socket paths are limited to about 100 characters, in a folder
+    #   only the current user can use, so another user cannot take the place of the daemon
+    import tempfile
+    folder = os.path.join(tempfile.gettempdir(), 'update_strings_%d' % os.getuid())
+    try:
+        os.mkdir(folder, 0o700)
+    except FileExistsError:
+        pass
 
-                    os.system(gen_strings_command)
+    stat = os.lstat(folder)
+    if not S_ISDIR(stat.st_mode) or stat.st_uid != os.getuid() or stat.st_mode & 0o077:
+        raise OSError('%s is not a folder private to the current user' % folder)
 
-                    if os.path.isfile(original):
-                        os.system('iconv -f UTF-16 -t UTF-8 "%s" > "%s"' % (original, new))
-                    else:
-                        open(new, 'w')
+    digest = hashlib.sha1(os.path.abspath(path).encode('utf_8')).hexdigest()[:12]
+    return os.path.join(folder, '%s.sock' % digest)
 
-                    if os.path.isfile(old):
-                        try:
-                            merge(merged, old, new, development_language)
 
-                        except Exception as e:
-                            print('Failed merging files with error ' + str(e))
+def project_fingerprint(path):
+    fnames = find_source_files(path)
+    for language in find_languages(path):
+        fnames.extend(os.path.join(language, name) for name in sorted(os.listdir(language))
+                      if name.endswith(STRINGS_EXTENSION))
+    return [(fname, file_signature(fname)) for fname in fnames]
 
-                            if os.path.isfile(original):
-                                os.remove(original)
-                            if os.path.isfile(new):
-                                os.remove(new)
-                            os.rename(old, original)
 
-                            quit(-254)
+def run_captured(path, routine, development_language_folder):
+    reset_run_state()
 
-                    else:
-                        if os.path.isfile(new):
-                            os.rename(new, original)
-                        else:
-                            if os.path.isfile(invalid):
-                                os.rename(invalid, original)
+    output = StringIO()
+    exit_code = 0
+    with redirect_stdout(output):
+        try:
+            localize_code(path, '', routine, development_language_folder)
+            exit_code = finish_run()
+        except SystemExit as e:
+            exit_code = e.code
 
-                else:
-                    DID_INITIALIZE = 1
-                    os.system(gen_strings_command)
+    return {'output': output.getvalue(), 'exit_code': exit_code}
 
-                    print('    Generated a new Localizable.strings file from source code.')
 
-                    if os.path.isfile(original):
-                        os.system('iconv -f UTF-16 -t UTF-8 "%s" > "%s"' % (original, old))
-                        initialize_file_from(old, new, development_language)
-                        os.rename(new, original)
-                    else:
-                        open(original, 'w')
+def receive_json(connection):
+    chunks = []
+    while True:
+        chunk = connection.recv(65536)
+        if not chunk:
+            break
+        chunks.append(chunk)
+    if len(chunks) == 0:
+        return None
+    return json.loads(b''.join(chunks).decode('utf_8'))
 
-                if os.path.isfile(old):
-                    os.remove(old)
-                if os.path.isfile(new):
-                    os.remove(new)
 
-            except Exception as e:
-                print('Failed processing files with error ' + str(e))
+def send_json(connection, data):
+    import socket
+    connection.sendall(json.dumps(data).encode('utf_8'))
+    connection.shutdown(socket.SHUT_WR)
 
-                quit(-254)
 
-    except:
-        print('- No language folders present -\n')
-        quit(-255)
+def watch_project(path, routine, development_language_folder, config):
+    # Keeps the project models in memory, updates the .strings files whenever a source or .strings
+    #   file changes and answers --client invocations with the result of the latest run
+    global WATCH_STATE
+    import signal
+    import socket
 
+    WATCH_STATE = WatchState()
+    try:
+        socket_fname = daemon_socket_fname(path)
+    except OSError as e:
+        print('Failed creating the daemon socket with error ' + str(e))
+        quit(-6)
 
-if __name__ == '__main__':
-    # Check for Python 3+
-    print('Executed with: ')
-    python_installed = os.system('python3 --version') == 0
-    if not python_installed:
-        print('This script is written in python and was build compatible to Python 3.7.3. ' +
-              '\nIt may run using Python 3+ versions but I recommend this version for ' +
-              'any troubleshooting involved.\nTo download Python on your mac, go to ' +
-              'https://www.python.org, download and install.')
-        quit(-1)
+    if os.path.exists(socket_fname):
+        probe = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        try:
+            probe.connect(socket_fname)
+            print('- A daemon is already watching %s -\n' % path)
+            quit(-6)
+        except OSError:
+            os.remove(socket_fname)
+        finally:
+            probe.close()
+
+    server = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    server.bind(socket_fname)
+    server.listen(8)
+    server.settimeout(WATCH_INTERVAL)
+
+    state = {'fingerprint': None, 'result': None}
+
+    def refresh():
+        fingerprint = project_fingerprint(path)
+        if fingerprint == state['fingerprint'] and state['result'] is not None:
+            return
+
+        start = perf_counter()
+        state['result'] = run_captured(path, routine, development_language_folder)
+        # Taken again, so the files written by the run do not trigger another one
+        state['fingerprint'] = project_fingerprint(path)
+        print('Updated in %d ms with exit code %d' % ((perf_counter() - start) * 1000, state['result']['exit_code']))
+
+    def stop(signum, frame):
+        raise KeyboardInterrupt()
+
+    signal.signal(signal.SIGTERM, stop)
+
+    print('Watching %s, press Ctrl+C to stop.\n' % path)
+    try:
+        while True:
+            try:
+                connection, _ = server.accept()
+            except socket.timeout:
+                refresh()
+                continue
+
+            with connection:
+                connection.settimeout(DAEMON_TIMEOUT)
+                try:
+                    request = receive_json(connection)
+                    if request is None:
+                        # Connection used to probe whether the daemon is running
+                        continue
+                    if request.get('config') != config:
+                        send_json(connection, {'error': 'The daemon was started with different arguments.'})
+                        continue
+
+                    refresh()
+                    send_json(connection, state['result'])
+                except (OSError, ValueError) as e:
+                    print('Failed answering a client with error ' + str(e))
+
+    except KeyboardInterrupt:
+        print('\nStopped watching %s' % path)
+
+    finally:
+        server.close()
+        if os.path.exists(socket_fname):
+            os.remove(socket_fname)
 
+
+def request_daemon(path, config):
+    # Returns the result of the daemon watching path, or None when there is no usable daemon
+    import socket
+
+    try:
+        socket_fname = daemon_socket_fname(path)
+    except OSError as e:
+        print('Failed reaching the daemon with error ' + str(e))
+        return None
+    if not os.path.exists(socket_fname):
+        return None
+
+    connection = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    connection.settimeout(DAEMON_TIMEOUT)
+    try:
+        connection.connect(socket_fname)
+        send_json(connection, {'config': config})
+        response = receive_json(connection) or {'error': 'The daemon did not answer.'}
+    except (OSError, ValueError) as e:
+        print('Failed reaching the daemon with error ' + str(e))
+        return None
+    finally:
+        connection.close()
+
+    if 'error' in response:
+        print('Not using the daemon: ' + response['error'])
+        return None
+
+    return response
+
+
+if __name__ == '__main__':
     print('\n')
 
     help_text = 'Please use only the following arguments and syntax:\n' \
@@ -480,11 +1937,35 @@ if __name__ == '__main__':
                 '          --nowarn\n' \
                 '          -rou=[routine]\n' \
                 '          -dev=[development_language]\n' \
+                '          --nocache\n' \
+                '          --jobs=[number_of_processes]\n' \
+                '          --stats-json=[path_to_stats_report]\n' \
+                '          --profile=[path_to_cprofile_dump]\n' \
+                '          --check\n' \
+                '          --watch\n' \
+                '          --client\n' \
+                '          --stream\n' \
+                '          --report=[json|summary|verbose]\n' \
+                '          --record-coverage\n' \
+                '          --coverage\n' \
+                '          -manifest=[path_to_list_of_project_roots]\n' \
+                '          --discover\n' \
                 'Please make sure to use \"\" for the argument values.\n' \
-                'For warnings to be treated as errors, add --strict.' % argv[0]
+                'For warnings to be treated as errors, add --strict.\n' \
+                'To validate without writing any file (e.g. on CI), add --check.\n' \
+                'To keep the project in memory, start a daemon with --watch and run the build phase with\n' \
+                '--client and the same arguments.\n' \
+                'To merge very large .strings files with bounded memory, add --stream.\n' \
+                'To only print the counts of every file, add --report=summary. --report=json also writes\n' \
+                'the keys of every file to %s/%s.\n' \
+                'To keep the coverage of every run in %s/%s, add --record-coverage. To list the keys\n' \
+                'that have been temporary the longest in every locale, run with --coverage.\n' \
+                'To update several projects at once, list their roots in a -manifest= file (one per line)\n' \
+                'or add --discover to update every folder under -src containing *.lproj folders.' \
+                % (argv[0], CACHE_FOLDER, REPORT_FILE, CACHE_FOLDER, COVERAGE_FILE)
 
     argc = len(argv)
-    if argc < 1 or 6 < argc:
+    if argc < 1 or 18 < argc:
         print(help_text)
         quit(-2)
 
@@ -492,6 +1973,13 @@ if __name__ == '__main__':
     TEMP_TAG = '*'.strip("'").strip('"')
     routine = 'NSLocalizedString'
     development_language = 'en'
+    stats_fname = None
+    profile_fname = None
+    watch = 0
+    client = 0
+    coverage = 0
+    manifest_fname = None
+    discover = 0
 
     for arg in argv:
         if arg == argv[0]:
@@ -512,6 +2000,55 @@ if __name__ == '__main__':
         if arg.startswith('--nowarn'):
             IGNORE_WARN = 1
             continue
+        if arg.startswith('--nocache'):
+            USE_CACHE = 0
+            continue
+        if arg.startswith('--check'):
+            CHECK_ONLY = 1
+            continue
+        if arg.startswith('--watch'):
+            watch = 1
+            continue
+        if arg.startswith('--client'):
+            client = 1
+            continue
+        if arg.startswith('--stream'):
+            STREAM_MERGE = 1
+            continue
+        if arg.startswith('--record-coverage'):
+            RECORD_COVERAGE = 1
+            continue
+        if arg.startswith('--coverage'):
+            coverage = 1
+            continue
+        if arg.startswith('-manifest='):
+            value = arg[10:]
+            if value != '':
+                manifest_fname = value
+                continue
+        if arg.startswith('--discover'):
+            discover = 1
+            continue
+        if arg.startswith('--report='):
+            value = arg[9:]
+            if value in REPORT_MODES:
+                REPORT = value
+                continue
+        if arg.startswith('--jobs='):
+            value = arg[7:]
+            if value.isdigit() and int(value) > 0:
+                JOBS = int(value)
+                continue
+        if arg.startswith('--stats-json='):
+            value = arg[13:]
+            if value != '':
+                stats_fname = value
+                continue
+        if arg.startswith('--profile='):
+            value = arg[10:]
+            if value != '':
+                profile_fname = value
+                continue
         if arg.startswith('-rou='):
             value = arg[5:]
             if value != '':
@@ -527,19 +2064,69 @@ if __name__ == '__main__':
 
     development_language_folder = os.path.splitext(development_language)[0] + LPROJ_EXTENSION
 
-    # Configure these paths to cover all your coding needs
-    localize_code(path, '', routine, development_language_folder)
+    # Everything that changes the outcome of a run, a daemon only answers clients using the same
+    config = {
+        'path': os.path.abspath(path),
+        'tag': TEMP_TAG,
+        'routine': routine,
+        'development_language_folder': development_language_folder,
+        'strict': SHOULD_TRIGGER_ERROR_BECAUSE_OF_DEFAULT_STRINGS,
+        'nowarn': IGNORE_WARN,
+        'check': CHECK_ONLY,
+        'cache': USE_CACHE,
+        'stream': STREAM_MERGE,
+        'report': REPORT,
+        'record_coverage': RECORD_COVERAGE,
+    }
+
+    if coverage:
+        print_coverage(path)
+        quit(0)
+
+    batch = manifest_fname is not None or discover
+    if batch and (watch or client):
+        print(help_text)
+        quit(-3)
 
-    info_for_temp_tag = '(strings prefixed with \'' + TEMP_TAG.encode('utf-8', errors='ignore') + '\')'
-    if (not DID_INITIALIZE) and SHOULD_TRIGGER_WARNING_BECAUSE_OF_TEMP_STRINGS and SHOULD_TRIGGER_ERROR_BECAUSE_OF_DEFAULT_STRINGS:
-        print('----- Xcode error -----')
-        os.system('echo "error: You have strings that are not translated! Replace all temporary strings ' + info_for_temp_tag.encode('utf-8', errors='ignore') +
-                  ' and add translated ones to be able to build the project without errors.%s"' % TEMP_WARNING_DETAILS.encode('utf-8', errors='ignore'))
-        quit(-4)
+    if watch:
+        watch_project(path, routine, development_language_folder, config)
+        quit(0)
+
+    if client:
+        result = request_daemon(path, config)
+        if result is not None:
+            print(result['output'], end='')
+            if result['exit_code']:
+                quit(result['exit_code'])
+            quit(0)
+
+    if stats_fname is not None:
+        STATS = RunStats()
+    profiler = None
+    if profile_fname is not None:
+        import cProfile
+        profiler = cProfile.Profile()
 
-    should_take_warn_into_account = (not IGNORE_WARN) and SHOULD_TRIGGER_WARNING_BECAUSE_OF_TEMP_STRINGS
-    if should_take_warn_into_account:
-        print('----- Xcode warning -----')
-        os.system('echo "warning: There are string keys which need to be translated.%s"' % TEMP_WARNING_DETAILS.encode('utf-8', errors='ignore'))
+    try:
+        if profiler is not None:
+            profiler.enable()
 
-    print('\n')
+        # Configure these paths to cover all your coding needs
+        with stats_phase('localize_code'):
+            if batch:
+                localize_projects(path, manifest_fname, routine, development_language_folder)
+            else:
+                localize_code(path, '', routine, development_language_folder)
+
+    finally:
+        if profiler is not None:
+            profiler.disable()
+            profiler.dump_stats(profile_fname)
+
+        if STATS is not None:
+            with open(stats_fname, encoding='utf_8', mode='w') as f:
+                json.dump(STATS.to_dict(), f, indent=2, sort_keys=True)
+
+    exit_code = finish_run()
+    if exit_code:
+        quit(exit_code)